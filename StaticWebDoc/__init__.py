@@ -4,21 +4,34 @@ import shutil
 import orjson
 import os
 import dataclasses
-import htmlmin
+import contextlib
+import io
+import multiprocessing
+import threading
 
 import jinja2.ext
 import jinja2.filters
 
+import StaticWebDoc.assets as assets
+import StaticWebDoc.beautify as beautify
+import StaticWebDoc.bundles as bundles
 import StaticWebDoc.extensions as extensions
+import StaticWebDoc.fileindex as fileindex
 import StaticWebDoc.filters as filters
 import StaticWebDoc.logging as logging
 import StaticWebDoc.loader as loader
+import StaticWebDoc.minify as minify
+import StaticWebDoc.modules as modules
+import StaticWebDoc.packaging as packaging
+import StaticWebDoc.postprocess as postprocess
+import StaticWebDoc.profiling as profiling
+import StaticWebDoc.search as search
 import StaticWebDoc.utils as utils
 
-from StaticWebDoc.environment import CustomEnvironment
-from StaticWebDoc.exceptions import RenderError
+from StaticWebDoc.dependencies import DependencyGraph, file_digest
+from StaticWebDoc.environment import CustomEnvironment, CompiledTemplateCache
+from StaticWebDoc.exceptions import RenderError, RenderDeferred
 from termcolor import colored
-from bs4 import BeautifulSoup as bs
 
 TEMPLATE_EXTENSION = ".jinja"
 OUTPUT_EXTENSION = ".html"
@@ -33,8 +46,12 @@ SCRIPT_DIR = "scripts"
 DATA_DIR = "data"
 IMAGE_DIR = "images"
 DEFAULT_BUILD_DIR = "build"
+DEFAULT_CACHE_DIR = ".swd"
+DEPENDENCY_FILE = "dependencies.json"
+BYTECODE_DIR = "bytecode"
 CACHE_FILE = "fields.json"
 OBJECT_FILE = "objects.json"
+ASSET_MANIFEST = "assets.json"
 
 # Global types/functions that have been added to be made available for use.
 GLOBAL_PROJECT_TYPES = []
@@ -105,6 +122,9 @@ def proj_type(value):
 
 	return value
 
+def _render_partition(templates):
+	return Project.current.render_partition(templates)
+
 def project_template_path():
 	return pathlib.Path(__file__).parent/"template"
 
@@ -114,6 +134,12 @@ def initialize_project(path):
 @dataclasses.dataclass(frozen=True)
 class BuildFlags:
 	beautify: bool = True
+	# Only renders templates whose sources or upstream templates changed since the last build.
+	incremental: bool = True
+	# Links styles and scripts by fingerprinted names, see StaticWebDoc.assets.
+	fingerprint: bool = False
+	# Links the module styles and scripts a page imports as one bundle each, see StaticWebDoc.bundles.
+	bundle: bool = False
 
 class Project:
 	current = None
@@ -121,6 +147,7 @@ class Project:
 	source: str = DEFAULT_TEMPLATE_DIR
 	output: str = DEFAULT_RENDER_DIR
 	build: str = DEFAULT_BUILD_DIR
+	cache_dir: str = DEFAULT_CACHE_DIR
 	modules_dir: str = DEFAULT_MODULE_DIR
 	script_dir: str = SCRIPT_DIR
 	style_dir: str = STYLE_DIR
@@ -133,7 +160,31 @@ class Project:
 	modules = []
 	template_filters = [filters.LastModified]
 	logger: logging.Logger = logging.DEFAULT
+	# Set to a profiling.Profiler to record the time every template and build phase takes.
+	profiler: profiling.Profiler | None = None
 	json_flags: int = orjson.OPT_INDENT_2
+	# Writes the embedded data of every template and data section to its own file, listed in
+	# data/embedded_index.json, instead of a single data/embedded_data.json.
+	shard_embedded_data: bool = False
+	# Writes the objects that the embedded data of several templates holds (e.g. shared nav entries, authors or tag
+	# lists) once, to data/embedded_objects.json, and refers to them from data/embedded_data.json. Not used together
+	# with shard_embedded_data.
+	intern_embedded_data: bool = False
+	# Builds a full text search index of the rendered pages in data/search/, see StaticWebDoc.search.
+	search_index: bool = False
+	# Worker processes which beautify/minify and write pages while the next template renders, with at most
+	# postprocess_pending pages waiting for them (None: two per worker). With 0 every page is streamed to its output
+	# by the render thread. Only used when rendering with a single process.
+	postprocess_workers: int = 0
+	postprocess_pending: int | None = None
+	# Stores compiled templates under the cache directory, so unchanged templates are not compiled again.
+	compile_cache: bool = True
+	# How package() puts files into the build directory (packaging.LINK_MODES), and whether files whose size
+	# matches but whose modification time does not are compared by content before they are copied again.
+	package_link: str = packaging.COPY
+	package_checksum: bool = False
+	# Writes precompressed siblings (.gz, .br) of the packaged text files when set.
+	package_compression: packaging.Compression | None = None
 
 	cache_file = CACHE_FILE
 	object_file = OBJECT_FILE
@@ -155,7 +206,13 @@ class Project:
 		self.__docroot = self.__output/self.document_dir
 		self.__dataroot = self.__output/self.data_dir
 		self.__build_dir = self.__proj_root/f"../{self.build}"
+		self.__cache = self.__proj_root/self.cache_dir
 		self.__build_spec = None
+		self.__dependencies = DependencyGraph(self.__cache/DEPENDENCY_FILE)
+		self.__module_loader = modules.REGISTRY
+		self.__assets = assets.AssetManifest(self.__locate_asset)
+		self.__bundler = bundles.Bundler(
+			self.__dataroot/bundles.BUNDLE_DIR, f"/{self.data_dir}/{bundles.BUNDLE_DIR}", self.__locate_asset)
 
 		if self.env is None:
 			env = CustomEnvironment()
@@ -172,6 +229,14 @@ class Project:
 		self.env.undefined = jinja2.StrictUndefined
 		self.env.extend(project_extension="", project=self)
 
+		if self.search_index:
+			self.env.extend(search_index=search.SearchIndex(self.env))
+
+		if self.compile_cache and self.env.bytecode_cache is None:
+			self.env.bytecode_cache = CompiledTemplateCache(self.__cache/BYTECODE_DIR, self.env)
+
+		# Files of the template directory, scanned once per build (see template_index).
+		self.__template_index = fileindex.FileIndex(self.__input)
 		self.__filters = list(map(lambda x: x(self), self.template_filters))
 
 		self.import_modules()
@@ -179,6 +244,22 @@ class Project:
 
 		self.__rendered_templates = set()
 		self.__renderable_templates = []
+		# Templates of a build that failed before they were rendered, so the next build picks them up again.
+		self.__pending = set()
+		self.__fresh = set()
+		# Templates of the last build which no longer exist, whose output is removed.
+		self.__removed = set()
+		self.__restored = False
+		# Inside of a render worker: the templates other workers or later waves are responsible for.
+		self.__deferrable = set()
+		# Rendering on demand (render_page): the rendered html of every template, and the modification times of
+		# the sources each template was rendered from.
+		self.__pages = None
+		self.__snapshots = {}
+		# Set while a build post-processes pages in worker processes.
+		self.__postprocess = None
+		self.__previous_mtimes = {}
+		self.__live_lock = threading.Lock()
 
 		self.init()
 
@@ -252,13 +333,15 @@ class Project:
 				for name, call in obj.get_callables().items():
 					self.add_global(name, call)
 
-	def __print_imported_scripts(self):
+	def __module_extension(self):
 		key = f"{extensions.ExternalModuleExtension.__module__}.{extensions.ExternalModuleExtension.__qualname__}"
-		return self.env.extensions[key].print_scripts()
+		return self.env.extensions[key]
+
+	def __print_imported_scripts(self):
+		return self.__module_extension().print_scripts()
 
 	def __print_imported_styles(self):
-		key = f"{extensions.ExternalModuleExtension.__module__}.{extensions.ExternalModuleExtension.__qualname__}"
-		return self.env.extensions[key].print_style()
+		return self.__module_extension().print_style()
 
 	def __add_proj_fn(self, name, fn):
 		self.add_global(name, lambda *args, **kwds: fn(self, *args, **kwds))
@@ -276,9 +359,14 @@ class Project:
 
 		return template.suffixes == [TEMPLATE_EXTENSION] and not template.is_relative_to(self.__modules)
 
+	@property
+	def template_index(self):
+		""" Paths and stat results of the files in the template directory, as of the start of the current build. """
+		return self.__template_index
+
 	def renderable_templates(self):
 		if len(self.__renderable_templates) == 0:
-			self.__renderable_templates = list(self.env.list_templates(filter_func=self.is_renderable_template))
+			self.__renderable_templates = [t for t in self.__template_index.files if self.is_renderable_template(t)]
 
 		return self.__renderable_templates
 
@@ -286,11 +374,13 @@ class Project:
 		if isinstance(paths, str):
 			paths = [paths]
 
+		if len(self.__render_stack) > 0:
+			self.__dependencies.add_listing(self.__render_stack[-1])
+
 		for p in paths:
-			for f in self.__input.rglob(p):
-				t = pathlib.Path(f).relative_to(self.__input)
+			for t in self.__template_index.glob(p):
 				if self.is_renderable_template(t):
-					yield t.as_posix()
+					yield t
 
 	def filtered_templates(self):
 		for temp in self.renderable_templates():
@@ -307,33 +397,387 @@ class Project:
 		if template_name in self.__rendered_templates:
 			return
 
-		path = self.output_file(template_name)
-		path.parent.mkdir(exist_ok=True, parents=True)
+		if template_name in self.__deferrable:
+			raise RenderDeferred(template_name)
 
-		with open(str(path), 'w') as output:
-			self.logger.normal(f"[Render] {template_name}", "blue")
+		with profiling.phase(self.profiler, profiling.TEMPLATE_PHASE, template_name):
+			self.__dependencies.begin(template_name)
+			self.__module_extension().begin(template_name)
+			self.__render_stack.append(template_name)
 
 			try:
 				template = self.env.get_template(template_name)
-				self.__render_stack.append(template_name)
 			except jinja2.TemplateNotFound as ex:
 				raise RenderError(template_name, ex)
 
-			try:
-				rendered_data = template.render(**{'PARAMS': self.__build_spec})
-			except (jinja2.TemplateAssertionError, jinja2.exceptions.UndefinedError) as ex:
-				raise RenderError(template_name, ex)
+			# Beautifying/minifying and writing happen while the page is generated, so they are profiled as interleaved
+			# phases of the render.
+			with profiling.phase(self.profiler, "render", template_name) as span:
+				try:
+					self.__write_page(template_name, template, span)
+				except (jinja2.TemplateAssertionError, jinja2.exceptions.UndefinedError) as ex:
+					raise RenderError(template_name, ex)
 
-			if self.__build_spec.beautify:
-				soup = bs(rendered_data, features="html.parser")
-				output.write(soup.prettify())
-			else:
-				soup = htmlmin.minify(rendered_data, remove_empty_space=True)
-				output.write(soup)
+			if self.__pages is not None:
+				self.__snapshots[template_name] = self.__source_mtimes(self.__dependencies.nodes[template_name].sources)
 
 			self.__rendered_templates.update({template_name})
 			self.__render_stack.pop()
 
+			# Only logged once the page is written, since render workers give up on templates that need the fields
+			# of a template another worker renders.
+			self.logger.normal(f"[Render] {template_name}", "blue")
+
+	def __write_page(self, template_name, template, span=None):
+		""" Renders the page and writes it, either streamed by this thread or queued for the post-processing workers. """
+		# Pages rendered on demand are not part of a build, and so not indexed.
+		if self.search_index and self.__pages is None:
+			extractor = search.TextExtractor()
+			index = profiling.timed(span, "search", extractor.feed)
+		else:
+			extractor = None
+			index = lambda chunk: None
+
+		if self.__postprocess is not None:
+			self.__queue_page(template_name, template, index, span)
+		else:
+			self.__stream_page(template_name, template, index, span)
+
+		if extractor is not None:
+			extractor.close()
+			self.env.search_index.add(template_name, self.template_to_outpath(template_name), extractor)
+
+	def __stream_page(self, template_name, template, index, span):
+		"""
+		Streams the page through the beautifier/minifier into its output, chunk by chunk as the template generates
+		it, so that a page is never held in memory more than once.
+		"""
+		pending = []
+
+		if self.__build_spec.beautify:
+			processor = beautify.HTMLBeautifier(pending.append)
+			feed = profiling.timed(span, "beautify", processor.feed)
+			close = profiling.timed(span, "beautify", processor.close)
+		else:
+			processor = minify.HTMLMinifier(pending.append, remove_empty_space=True)
+			feed = profiling.timed(span, "minify", processor.feed)
+			close = profiling.timed(span, "minify", processor.close)
+
+		with self.__page_output(template_name) as output:
+			write = profiling.timed(span, "write", output.write)
+
+			for chunk in template.generate(PARAMS=self.__build_spec):
+				# Chunks can be Markup, which would escape everything the parser appends to its buffer afterwards.
+				chunk = str(chunk)
+				feed(chunk)
+				index(chunk)
+
+				if len(pending) > 0:
+					write("".join(pending))
+					pending.clear()
+
+			close()
+			write("".join(pending))
+
+	def __queue_page(self, template_name, template, index, span):
+		"""
+		Hands the generated page to the post-processing workers, waiting (profiled as backpressure) while too many
+		pages are queued already. The import links are resolved here, since they need the state of the project.
+		"""
+		page = []
+
+		for chunk in template.generate(PARAMS=self.__build_spec):
+			chunk = str(chunk)
+			page.append(chunk)
+			index(chunk)
+
+		submit = profiling.timed(span, "backpressure", self.__postprocess.submit)
+		submit(
+			template_name,
+			postprocess.write_page,
+			self.output_file(template_name),
+			self.__input/template_name,
+			"".join(page),
+			self.__build_spec.beautify,
+			self.__import_links(template_name))
+
+	@contextlib.contextmanager
+	def __page_output(self, template_name):
+		"""
+		Output of a page: in memory when rendering on demand, otherwise a temporary file which replaces the page only
+		once it has been written completely (so a failed render never leaves half a page behind).
+		"""
+		if self.__pages is not None:
+			output = io.StringIO()
+			yield output
+			page = output.getvalue()
+
+			links = self.__import_links(template_name)
+			if len(links) > 0:
+				page = bundles.link_markers(page, links)
+
+			self.__pages[template_name] = page
+			return
+
+		path = self.output_file(template_name)
+		path.parent.mkdir(exist_ok=True, parents=True)
+		temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+		try:
+			with open(temporary, 'w') as output:
+				yield output
+
+			self.__link_imports(template_name, temporary)
+			postprocess.replace_page(temporary, path, self.__input/template_name)
+		except BaseException:
+			temporary.unlink(missing_ok=True)
+			raise
+
+	def __link_imports(self, template_name, path):
+		""" Replaces the import markers of the page at path with its links. """
+		links = self.__import_links(template_name)
+		if len(links) == 0:
+			return
+
+		linked = path.with_name(f"{path.name}.linked")
+
+		try:
+			bundles.replace_markers(path, linked, links)
+			os.replace(linked, path)
+		except BaseException:
+			linked.unlink(missing_ok=True)
+			raise
+
+	def __import_links(self, template_name):
+		"""
+		The links to the module styles and scripts the page imported, by the marker they replace (nothing when the
+		page printed neither imported_styles() nor imported_scripts()). The markers are replaced in the beautified or
+		minified page, so the links are formatted the same way.
+		"""
+		imports = self.__module_extension().finish(template_name)
+		if not imports.printed:
+			return {}
+
+		styles = [utils.style_url(path) for path in imports.styles]
+		scripts = [utils.script_url(path) for path in imports.scripts]
+		if self.__build_spec.bundle:
+			styles, sources = self.__bundler.bundle(styles, bundles.STYLE_SUFFIX)
+			scripts, script_sources = self.__bundler.bundle(scripts, bundles.SCRIPT_SUFFIX)
+
+			# The bundles change with their sources, and so do the pages linking them.
+			for source in sources + script_sources:
+				self.add_dependency(str(source))
+		else:
+			styles = [(url, False) for url in styles]
+			scripts = [(url, False) for url in scripts]
+
+		for url, bundled in styles + scripts:
+			if bundled:
+				self.__dependencies.add_bundle(template_name, pathlib.PurePosixPath(url).name)
+
+		style_tags = [utils.style_tag(url if bundled else self.asset_url(url)) for url, bundled in styles]
+		script_tags = [utils.script_tag(url if bundled else self.asset_url(url)) for url, bundled in scripts]
+
+		if self.__build_spec.beautify:
+			formatted = lambda tags: beautify.beautify("\n".join(tags)).strip()
+		else:
+			formatted = lambda tags: minify.minify("".join(tags), remove_empty_space=True)
+
+		return {
+			bundles.STYLES_MARKER: formatted(style_tags),
+			bundles.SCRIPTS_MARKER: formatted(script_tags)
+		}
+
+	def render_page(self, template_name):
+		"""
+		Renders a single template in memory and returns its html, without writing any output. Used by the test server
+		to render pages on demand: the first call restores the state of the last build, after that the page and the
+		templates whose fields it uses are only rendered again when one of their sources has changed.
+		"""
+		with self.__live_lock:
+			if self.__pages is None:
+				self.__start_live()
+
+			stale = self.__live_stale(template_name)
+
+			if template_name not in stale and template_name in self.__pages:
+				return self.__pages[template_name]
+
+			for cache in self.__data_caches():
+				cache.discard(stale)
+
+			self.__rendered_templates -= stale
+			self.__rendered_templates.discard(template_name)
+
+			# Templates may have been added or removed since the last page was rendered.
+			self.__template_index.invalidate()
+			self.__renderable_templates = []
+
+			try:
+				self.request_render(template_name)
+			finally:
+				self.__render_stack = []
+
+			return self.__pages[template_name]
+
+	def __start_live(self):
+		self.__build_spec = self.default_build_flags
+		self.pre_process()
+
+		# Sources are compared against the modification times they had when the last build rendered them.
+		self.__previous_mtimes = self.__dependencies.mtimes()
+
+		for cache in self.__data_caches():
+			cache.restore(self.__cache, set())
+
+		if self.__build_spec.fingerprint:
+			self.__assets.load(self.__output/ASSET_MANIFEST)
+
+		self.__pages = {}
+
+	def __source_mtimes(self, sources):
+		mtimes = {}
+		for source in sources:
+			try:
+				mtimes[source] = os.stat(source).st_mtime_ns
+			except FileNotFoundError:
+				mtimes[source] = None
+
+		return mtimes
+
+	def __live_stale(self, template_name):
+		""" Returns the templates, out of the page and those whose fields it uses, that need to be rendered again. """
+		nodes = self.__dependencies.nodes
+		stale = set()
+		visited = set()
+
+		def visit(template):
+			if template in visited:
+				return template in stale
+
+			visited.add(template)
+			node = nodes.get(template)
+
+			if node is None:
+				changed = True
+			else:
+				snapshot = self.__snapshots.get(template)
+				if snapshot is None:
+					snapshot = { s: self.__previous_mtimes.get(s) for s in node.sources }
+
+				changed = self.__source_mtimes(snapshot) != snapshot
+
+				# Templates which list the template tree can not tell when a template was added, so they are
+				# rendered again whenever they are requested.
+				changed = changed or (node.listing and template == template_name)
+
+				for target in node.fields:
+					changed = visit(target) or changed
+
+			if changed:
+				stale.add(template)
+
+			return changed
+
+		visit(template_name)
+
+		return stale
+
+	def render_partition(self, templates):
+		"""
+		Renders a partition of the templates inside of a render worker, and returns everything the main process
+		needs to merge the results: the fields and data of every rendered template, their recorded dependencies
+		and the module assets they imported. Templates which need fields of a template another worker is responsible
+		for are given back as deferred.
+		"""
+		previous = set(self.__rendered_templates)
+		events = 0 if self.profiler is None else len(self.profiler.events)
+		self.__deferrable = self.__deferrable - set(templates)
+		deferred = []
+
+		for template in templates:
+			try:
+				self.request_render(template)
+			except RenderDeferred as ex:
+				self.__render_stack = []
+				deferred.append((template, ex.template))
+
+		rendered = self.__rendered_templates - previous
+		include = lambda t: t in rendered or not self.is_renderable_template(t)
+
+		return {
+			"rendered": sorted(rendered),
+			"deferred": [(t, waiting) for t, waiting in deferred if t not in rendered],
+			"caches": { cache.cache_file: cache.export(include) for cache in self.__data_caches() },
+			"dependencies": self.__dependencies.export(rendered),
+			"events": [] if self.profiler is None else self.profiler.events[events:],
+			"assets": self.__assets.entries
+		}
+
+	def __merge_partition(self, result, owners):
+		for cache in self.__data_caches():
+			entries = result["caches"][cache.cache_file]
+			for owner in owners:
+				if owner in entries:
+					cache.merge(entries[owner])
+
+		self.__dependencies.merge(self.__dependencies_of(result, owners))
+		self.__rendered_templates.update(t for t in result["rendered"] if t in owners)
+
+	def __dependencies_of(self, result, owners):
+		state = result["dependencies"]
+		return { "nodes": { t: n for t, n in state["nodes"].items() if t in owners }, "sources": state["sources"] }
+
+	def __render_parallel(self, templates, jobs):
+		"""
+		Renders the templates with a pool of forked worker processes. The templates are split into waves using the
+		fields each template looked up during the previous build, so that get_field requests across workers are
+		answered from the merged fragment cache of earlier waves. When a worker misses a field of a template that
+		another worker (or a later wave) renders, the template is deferred instead of rendering the other template
+		twice. Deferred templates are rendered in this process once the waves are done, which renders the templates
+		they wait for on demand, however long the chain of get_field requests is (a first build knows no fields,
+		and so has a single wave). When merging, the result of the worker the template was assigned to always wins
+		so that the merge does not depend on worker timing.
+		"""
+		context = multiprocessing.get_context("fork")
+		deferred = []
+
+		for wave in self.__dependencies.schedule(templates):
+			wave = [t for t in wave if t not in self.__rendered_templates]
+			chunks = [wave[i::jobs] for i in range(min(jobs, len(wave)))]
+
+			if len(chunks) == 0:
+				continue
+
+			self.__deferrable = { t for t in templates if t not in self.__rendered_templates }
+
+			try:
+				with profiling.phase(self.profiler, "wave"), context.Pool(len(chunks)) as pool:
+					results = pool.map(_render_partition, chunks, chunksize=1)
+			finally:
+				self.__deferrable = set()
+
+			for chunk, result in zip(chunks, results):
+				self.__merge_partition(result, set(chunk))
+
+			for result in results:
+				if self.profiler is not None:
+					self.profiler.merge(result["events"])
+
+				extra = set(result["rendered"]) - self.__rendered_templates
+				extra.update(t for entries in result["caches"].values() for t in entries if not self.is_renderable_template(t))
+				self.__merge_partition(result, extra)
+				self.__assets.merge(result["assets"])
+
+			deferred.extend(template for result in results for template, _ in result["deferred"])
+
+		# The fragment cache now holds the fields of every template the workers rendered, so only the templates the
+		# deferred ones wait for (and have not been rendered yet) are rendered on the way. get_field cycles are
+		# reported the same way a single process build reports them.
+		with profiling.phase(self.profiler, "deferred"):
+			for template in deferred:
+				self.request_render(template)
+
 	def push_context_data(self, context_name, value):
 		if context_name in self.__context_data:
 			self.__context_data[context_name].append(value)
@@ -358,6 +802,43 @@ class Project:
 		else:
 			raise ValueError(f"Context data does not exist for key {context_name}")
 
+	def add_dependency(self, filename):
+		if len(self.__render_stack) > 0:
+			self.__dependencies.add_source(self.__render_stack[-1], filename)
+
+	def add_field_dependency(self, template_name):
+		if len(self.__render_stack) > 0 and template_name != self.__render_stack[-1]:
+			self.__dependencies.add_field(self.__render_stack[-1], template_name)
+
+	def __locate_asset(self, url):
+		""" Returns the file a style or script url is served from, or None for any other url. """
+		path = pathlib.PurePosixPath(url)
+
+		if url.startswith("/@"):
+			try:
+				return pathlib.Path(self.__module_loader.file_path(url[1:]))
+			except (ImportError, ValueError):
+				return None
+
+		for prefix, directory in [(SCRIPT_DIR, self.__scripts), (STYLE_DIR, self.__styles)]:
+			if path.is_relative_to(f"/{prefix}"):
+				return directory/path.relative_to(f"/{prefix}")
+
+		return None
+
+	def asset_url(self, url):
+		""" Returns the url a style or script is linked with, see BuildFlags.fingerprint. """
+		if not isinstance(self.__build_spec, BuildFlags) or not self.__build_spec.fingerprint:
+			return url
+
+		source = self.__locate_asset(url)
+
+		# The page needs to be rendered again when the asset changes, since its fingerprint changes.
+		if source is not None and source.is_file():
+			self.add_dependency(str(source))
+
+		return self.__assets.url(url)
+
 	def current_template(self):
 		return self.__render_stack[-1]
 
@@ -366,7 +847,13 @@ class Project:
 
 	def env_data(self, env_key, key=None, default=None, template=None):
 		data = self.env.embedded_data
-		ctemp = template_to_name(self.current_template()) if template is None else template
+
+		if template is None:
+			ctemp = template_to_name(self.current_template())
+		else:
+			ctemp = template
+			self.add_field_dependency(template + TEMPLATE_EXTENSION)
+			self.__request_data(template)
 
 		if ctemp in data:
 			envs = data[ctemp]
@@ -380,6 +867,27 @@ class Project:
 
 		return default
 
+	def __request_data(self, template):
+		"""
+		Renders template when its embedded data is needed before it has been rendered, or when its data is held as
+		JSON values (restored from the previous build) rather than the objects its data tags set: JSON values lose
+		the types of project objects, and with them their methods.
+		"""
+		data = self.env.embedded_data
+		template_name = template + TEMPLATE_EXTENSION
+
+		if data.is_live(template) or template_name in self.__render_stack:
+			return
+
+		if template in data:
+			data.discard({template_name})
+			self.__rendered_templates.discard(template_name)
+		elif template_name not in self.__pending and self.__pages is None:
+			# Unchanged templates without data have none to give.
+			return
+
+		self.request_render(template_name)
+
 	@property
 	def output_dir(self):
 		return self.__output
@@ -397,6 +905,40 @@ class Project:
 			self.logger.normal(f'- Removing directory: {self.__dataroot}')
 			shutil.rmtree(self.__dataroot)
 
+	def __remove_orphans(self):
+		"""
+		Removes the pages of templates which were deleted or renamed since the last build, instead of cleaning the
+		whole output, so that unchanged pages keep their files. A full build also removes every other file in the
+		document directory which is not the page of a template. Bundles which no page links any more are removed as
+		well. Data files of removed templates are dropped by the data writers.
+		"""
+		# Every existing template has a node once the build is done.
+		pages = { self.output_file(t) for t in self.__dependencies.nodes }
+		orphans = { self.output_file(t) for t in self.__removed }
+
+		if not self.__build_spec.incremental and self.__docroot.exists():
+			orphans.update(path for path in self.__docroot.rglob("*") if path.is_file())
+
+		orphans = sorted(path for path in orphans - pages if path.exists())
+		for path in orphans:
+			self.logger.normal(f'- Removing orphaned output: {path}')
+			path.unlink()
+
+		if len(orphans) > 0:
+			packaging.remove_empty_dirs(self.__docroot)
+
+		# Bundles are named by their content, so every change of an asset or of the imports of a page leaves one.
+		bundle_dir = self.__dataroot/bundles.BUNDLE_DIR
+		linked = self.__dependencies.bundles()
+
+		if bundle_dir.exists():
+			for path in sorted(bundle_dir.iterdir()):
+				if path.name not in linked:
+					self.logger.normal(f'- Removing orphaned bundle: {path}')
+					path.unlink()
+
+		self.__removed = set()
+
 	def __write_data(self):
 		self.__dataroot.mkdir(exist_ok=True, parents=True)
 
@@ -405,6 +947,49 @@ class Project:
 			if isinstance(obj, extensions.DataExtensionObject):
 				obj.write(self.__dataroot)
 
+	def __write_manifest(self):
+		path = self.__output/ASSET_MANIFEST
+
+		if self.__build_spec.fingerprint:
+			self.__assets.write(path, self.json_flags)
+		elif path.exists():
+			path.unlink()
+
+	def __data_caches(self):
+		for v in dir(self.env):
+			obj = getattr(self.env, v)
+			if isinstance(obj, extensions.SimpleCache):
+				yield obj
+
+	def __build_signature(self):
+		""" A change in the build flags or the project definition invalidates every rendered template. """
+		project_file = self.__proj_root/"__init__.py"
+		project_digest = file_digest(project_file) if project_file.exists() else ""
+
+		# Whether or not the build is incremental does not change what gets rendered.
+		flags = dataclasses.replace(self.__build_spec, incremental=True)
+
+		return f"{flags!r}:{project_digest}"
+
+	def stale_templates(self):
+		"""
+		Returns the templates that need to be rendered for the current build. Templates selected by the template
+		filters are always included. Also determines which templates are still fresh, whose fields from the
+		previous build can be reused.
+		"""
+		templates = set(self.renderable_templates())
+
+		stale = self.__dependencies.stale_templates(templates, self.__build_signature())
+		stale.update(templates & self.__pending)
+		self.__fresh = templates - stale
+		self.__removed = self.__removed | self.__dependencies.removed
+
+		if not self.__build_spec.incremental:
+			return templates
+
+		stale.update(self.filtered_templates())
+
+		return stale
 
 	def pre_process(self):
 		pass
@@ -412,7 +997,7 @@ class Project:
 	def post_process(self):
 		pass
 
-	def render(self, build_spec=None):
+	def render(self, build_spec=None, jobs=1):
 		if build_spec is None:
 			self.__build_spec = self.default_build_flags
 		else:
@@ -423,26 +1008,145 @@ class Project:
 			else:
 				self.__build_spec = self.default_build_flags
 
-		self.clean()
 		self.pre_process()
+		self.__template_index.invalidate()
 
-		for template in self.renderable_templates():
-			self.request_render(template)
+		with profiling.phase(self.profiler, "stale"):
+			stale = self.stale_templates()
+			self.__pending = stale
 
-		self.__rendered_templates = set()
-		self.__renderable_templates = []
+		# A project that stays alive between builds (watch mode) still holds the entries of unchanged templates,
+		# so the previous build only needs to be restored once.
+		with profiling.phase(self.profiler, "restore"):
+			for cache in self.__data_caches():
+				cache.discard(stale | self.__removed)
+
+				if self.__build_spec.incremental and not self.__restored:
+					cache.restore(self.__cache, stale | self.__removed)
+
+		self.__restored = True
+		self.env.fragment_cache.serve_previous(self.__cache, self.__fresh)
+
+		if self.__build_spec.fingerprint:
+			self.__assets.load(self.__output/ASSET_MANIFEST)
+
+		if jobs > 1 and "fork" not in multiprocessing.get_all_start_methods():
+			self.logger.warning("- Parallel rendering needs the fork start method, rendering with a single process.")
+			jobs = 1
+
+		postprocess_workers = self.postprocess_workers
+		if postprocess_workers > 0 and "fork" not in multiprocessing.get_all_start_methods():
+			self.logger.warning("- Post-processing workers need the fork start method, writing pages while rendering.")
+			postprocess_workers = 0
+
+		try:
+			if jobs > 1:
+				self.__render_parallel([t for t in self.renderable_templates() if t in stale], jobs)
+			else:
+				if postprocess_workers > 0:
+					self.__postprocess = postprocess.PagePipeline(postprocess_workers, self.postprocess_pending)
+
+				# Rendering in waves renders the templates whose fields are looked up first, which keeps get_field
+				# from pulling their renders into the stack of the template that needs them.
+				ordered = [t for t in self.renderable_templates() if t in stale]
+				for wave in self.__dependencies.schedule(ordered):
+					for template in wave:
+						self.request_render(template)
+
+				if self.__postprocess is not None:
+					with profiling.phase(self.profiler, "postprocess"):
+						self.__postprocess.drain()
+
+			self.logger.normal(f"- Rendered {len(self.__rendered_templates)} of {len(self.renderable_templates())} templates")
+		finally:
+			if self.__postprocess is not None:
+				self.__postprocess.close()
+				self.__postprocess = None
+
+			self.__rendered_templates = set()
+			self.__renderable_templates = []
+			self.__render_stack = []
+
+		with profiling.phase(self.profiler, "data"):
+			self.__write_data()
+			self.__write_manifest()
+			self.__remove_orphans()
 
-		self.__write_data()
 		self.post_process()
+
+		with profiling.phase(self.profiler, "persist"):
+			self.__cache.mkdir(exist_ok=True, parents=True)
+			for cache in self.__data_caches():
+				cache.persist(self.__cache)
+
+			self.__dependencies.save(self.__build_signature())
+
+			# Compiled templates of deleted templates, or of other settings, would otherwise stay in the cache forever.
+			if isinstance(self.env.bytecode_cache, CompiledTemplateCache):
+				pruned = self.env.bytecode_cache.prune(self.__dependencies.used_sources())
+				if pruned > 0:
+					self.logger.normal(f"- Removed {pruned} stale compiled templates")
+		self.__pending = set()
 		self.__build_spec = {}
 
-	def package(self):
-		shutil.rmtree(self.__build_dir, ignore_errors=True)
+	def watch_paths(self):
+		""" Returns the directories and files whose changes can affect the rendered output. """
+		paths = {self.__input, self.__modules, self.__styles, self.__scripts}
+
+		# Sources of @module templates live inside of their python packages.
+		for source in self.__dependencies.sources:
+			source = pathlib.Path(source)
+			if not source.is_relative_to(self.__input):
+				paths.add(source)
 
-		shutil.copytree(self.__output, self.__build_dir, dirs_exist_ok=True)
-		shutil.copytree(self.__scripts, self.__build_dir/SCRIPT_DIR, dirs_exist_ok=True)
-		shutil.copytree(self.__styles, self.__build_dir/STYLE_DIR, dirs_exist_ok=True)
-		shutil.copytree(self.__images, self.__build_dir/IMAGE_DIR, dirs_exist_ok=True)
+		return sorted(paths)
+
+	def asset_dirs(self):
+		""" Directories which are served as is, and do not need a render when they change. """
+		if self.default_build_flags.fingerprint:
+			return [self.__images]
+
+		return [self.__styles, self.__scripts, self.__images]
+
+	def package(self, link=None, checksum=None, compression=None):
+		"""
+		Synchronizes the build directory with the rendered output, scripts, styles and images. Only new and changed
+		files are copied, and files without a source are removed. Fingerprinted assets of the last build (including
+		those of @modules) are added under their fingerprinted names. With compression (or package_compression) the
+		text files are precompressed afterwards. Returns a packaging.SyncReport.
+		"""
+		if compression is None:
+			compression = self.package_compression
+
+		sources = [
+			(self.__output, pathlib.Path()),
+			(self.__scripts, pathlib.Path(SCRIPT_DIR)),
+			(self.__styles, pathlib.Path(STYLE_DIR)),
+			(self.__images, pathlib.Path(IMAGE_DIR))]
+
+		files = {}
+		for target, url in assets.read_manifest(self.__output/ASSET_MANIFEST).items():
+			source = self.__locate_asset(url)
+			if source is not None and source.is_file():
+				files[pathlib.Path(target.lstrip("/"))] = source
+
+		with profiling.phase(self.profiler, "package"):
+			report = packaging.sync(
+				sources, self.__build_dir,
+				self.package_link if link is None else link,
+				self.package_checksum if checksum is None else checksum,
+				files,
+				() if compression is None else compression.suffixes)
+
+		self.logger.normal(f"- Packaged: {report.summary()}")
+
+		if compression is not None:
+			with profiling.phase(self.profiler, "compress"):
+				compressed = packaging.compress(self.__build_dir, compression)
+
+			self.logger.normal(f"- Compressed: {compressed.summary()}")
+
+		return report
 
 	@property
 	def default_build_flags(self):
@@ -3,13 +3,20 @@ import importlib
 import importlib.util
 import os
 import pathlib
+import sys
 import argparse
+import dataclasses
+import threading
 import traceback
 import jinja2
 from termcolor import colored
 from . import exceptions
+from . import packaging
+from . import profiling
 from .logging import DEFAULT as logger
 
+PROFILE_FILE = "swd-profile.json"
+
 class App:
 	def __init__(self):
 		self.__parser = argparse.ArgumentParser(
@@ -31,11 +38,35 @@ class App:
 			"--init", action="store_true")
 		self.__parser.add_argument(
 			"--package", action="store_true")
+		self.__parser.add_argument(
+			"--link", type=str, choices=packaging.LINK_MODES,
+			help="How --package puts files into the build directory (default: the project's package_link).")
+		self.__parser.add_argument(
+			"--compress", type=str, action="append", choices=list(packaging.COMPRESSORS), metavar="ALGORITHM",
+			help=f"Precompresses the packaged text files, can be repeated ({', '.join(packaging.COMPRESSORS)}).")
+		self.__parser.add_argument(
+			"--checksum", action="store_true", default=None,
+			help="Compares files by content when --package can not tell from their size and modification time.")
+		self.__parser.add_argument(
+			"--jobs", "-j", type=int, default=1, help="Number of processes used to render templates.")
+		self.__parser.add_argument(
+			"--profile", type=str, nargs="?", const=PROFILE_FILE, metavar="TRACE",
+			help=f"Records the time every template and build phase takes, and writes a Chrome trace (default: {PROFILE_FILE}).")
+		self.__parser.add_argument(
+			"--profile-top", type=int, default=10, metavar="N", help="Number of slowest templates listed by --profile.")
 		self.__parser.add_argument(
 			"--server", action="store_true", help="Starts up a testing HTTP server. Do not use in production.")
+		self.__parser.add_argument(
+			"--on-demand", action="store_true",
+			help="With --server, renders every requested page in memory instead of serving the render directory.")
+		self.__parser.add_argument(
+			"--watch", "-w", action="store_true",
+			help="Renders again whenever the project changes. Combined with --server, open pages reload after each build.")
 
 	def run(self):
-		if self.args.server:
+		if self.args.watch:
+			self.__watch()
+		elif self.args.server:
 			self.__server()
 		elif self.args.init:
 			self.__init_project()
@@ -46,11 +77,18 @@ class App:
 		elif self.args.package:
 			self.__get_project()
 			logger.normal(f"- Packaging project: {type(self.__project).__name__}")
-			self.__project.package()
+			compression = None
+			if self.args.compress is not None:
+				compression = dataclasses.replace(
+					self.__project.package_compression or packaging.Compression(), algorithms=tuple(self.args.compress))
+
+			self.__project.package(link=self.args.link, checksum=self.args.checksum, compression=compression)
+			self.__write_profile()
 		else:
 			self.__get_project()
-			self.__project.render()
+			self.__project.render(jobs=self.args.jobs)
 			logger.normal("[Finished]", "green")
+			self.__write_profile()
 
 	@property
 	def proj_dir(self):
@@ -63,7 +101,33 @@ class App:
 	def __server(self):
 		import StaticWebDoc.server as serv
 		root = pathlib.Path(self.proj_dir)
-		serv.main(root)
+
+		if self.args.on_demand:
+			serv.main(root, project=self.__get_project())
+		else:
+			serv.main(root)
+
+	def __watch(self):
+		import StaticWebDoc.watch as watch
+		notifier = None
+
+		self.__get_project()
+
+		if self.args.server:
+			import StaticWebDoc.server as serv
+			notifier = serv.ReloadNotifier()
+			threading.Thread(target=serv.main, args=(pathlib.Path(self.proj_dir), notifier), daemon=True).start()
+
+		watch.watch(self.__project, None if notifier is None else notifier.notify, jobs=self.args.jobs)
+
+	def __write_profile(self):
+		profiler = self.__project.profiler
+		if profiler is None:
+			return
+
+		profiler.report(logger, self.args.profile_top)
+		profiler.write(self.args.profile)
+		logger.normal(f"- Wrote profile: {self.args.profile}")
 
 	def __init_project(self):
 		root = pathlib.Path(self.proj_dir).absolute()
@@ -78,6 +142,8 @@ class App:
 
 		spec = importlib.util.spec_from_file_location(self.proj_dir.name, self.proj_dir/"__init__.py")
 		code = importlib.util.module_from_spec(spec)
+		# Registered under its name, so that render workers can pickle the objects of the project types it defines.
+		sys.modules.setdefault(spec.name, code)
 		spec.loader.exec_module(code)
 
 		for var in dir(code):
@@ -87,6 +153,9 @@ class App:
 					logger.normal(f"- Found project declaration: {obj.__name__}")
 					project = obj(self.proj_dir)
 
+					if self.args.profile is not None:
+						project.profiler = profiling.Profiler()
+
 					self.__project = project
 					return project
 
@@ -0,0 +1,86 @@
+"""
+Asset fingerprinting: gives every style and script that a page links to a name containing the hash of its content
+(main.css becomes main.<hash>.css), so the packaged assets can be cached forever and a changed asset is always
+requested again. The manifest maps every asset url to its fingerprinted url, and is used by packaging and the test
+server to find the file behind a fingerprinted name.
+"""
+
+import hashlib
+import os
+import pathlib
+
+import orjson
+
+# Size of the content digest in bytes, the name gets twice as many hex characters.
+FINGERPRINT_SIZE = 8
+
+def fingerprinted(url, digest):
+	path = pathlib.PurePosixPath(url)
+	return str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+class AssetManifest:
+	"""
+	Fingerprints assets on first use. locate maps the url of an asset to the file it is served from, or None when
+	the url does not belong to an asset that can be fingerprinted.
+	"""
+
+	def __init__(self, locate):
+		self.__locate = locate
+		self.__entries = {}
+
+	@property
+	def entries(self):
+		return self.__entries
+
+	def url(self, url):
+		if url in self.__entries:
+			return self.__entries[url]
+
+		source = self.__locate(url)
+		if source is None or not source.is_file():
+			return url
+
+		digest = hashlib.blake2b(source.read_bytes(), digest_size=FINGERPRINT_SIZE).hexdigest()
+		self.__entries[url] = fingerprinted(url, digest)
+
+		return self.__entries[url]
+
+	def merge(self, entries):
+		self.__entries.update(entries)
+
+	def load(self, path):
+		"""
+		Loads the manifest of the previous build and fingerprints its assets again, since pages rendered by an
+		earlier build still link to them.
+		"""
+		try:
+			with open(path, "rb") as f:
+				previous = orjson.loads(f.read())
+		except (FileNotFoundError, orjson.JSONDecodeError):
+			previous = {}
+
+		self.__entries = {}
+		for url in previous:
+			self.url(url)
+
+	def write(self, path, json_flags=0):
+		# Replaced rather than written in place, like every file of the render, see packaging.sync().
+		temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+		with open(temporary, "wb") as f:
+			f.write(orjson.dumps(self.__entries, option=json_flags | orjson.OPT_SORT_KEYS))
+
+		os.replace(temporary, path)
+
+def read_manifest(path):
+	""" Maps every fingerprinted url in the manifest at path back to the url of the asset. """
+	try:
+		with open(path, "rb") as f:
+			return { target: url for url, target in orjson.loads(f.read()).items() }
+	except (FileNotFoundError, orjson.JSONDecodeError):
+		return {}
+
+__all__ = [
+	"AssetManifest",
+	"read_manifest",
+]
@@ -0,0 +1,213 @@
+"""
+A single pass HTML pretty printer. Unlike BeautifulSoup.prettify() it never builds a tree: tags are written out as
+soon as they are tokenized, so it can be fed a page in chunks and only keeps the stack of open tags in memory.
+
+The layout follows prettify(): every tag, comment and text node goes on its own line, indented by its depth, and
+the content of whitespace sensitive elements is kept as is. Formatting already formatted output yields the same
+output again.
+"""
+
+import html.parser
+
+# Elements which never have content or an end tag.
+VOID_ELEMENTS = frozenset([
+	"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"
+])
+
+# Elements whose content is written verbatim.
+PRESERVE_ELEMENTS = frozenset(["pre", "textarea"])
+RAW_TEXT_ELEMENTS = frozenset(["script", "style"])
+
+BLOCK_ELEMENTS = frozenset([
+	"address", "article", "aside", "blockquote", "details", "div", "dl", "fieldset", "figcaption", "figure",
+	"footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "main", "nav", "ol", "p", "pre",
+	"section", "table", "ul"
+])
+
+# Maps an element to the open elements it implicitly closes, for elements with optional end tags.
+IMPLICIT_CLOSE = {
+	"li": frozenset(["li"]),
+	"dt": frozenset(["dt", "dd"]),
+	"dd": frozenset(["dt", "dd"]),
+	"tr": frozenset(["tr", "td", "th"]),
+	"td": frozenset(["td", "th"]),
+	"th": frozenset(["td", "th"]),
+	"option": frozenset(["option"]),
+	**{ tag: frozenset(["p"]) for tag in BLOCK_ELEMENTS }
+}
+
+FLUSH_SIZE = 1 << 16
+
+def escape_attribute(value):
+	return value.replace("&", "&amp;").replace('"', "&quot;").replace("<", "&lt;").replace(">", "&gt;")
+
+class HTMLBeautifier(html.parser.HTMLParser):
+	"""
+	Incremental pretty printer. Call feed() with as many chunks as needed and close() at the end. Output is passed
+	to the write callable in batches of roughly FLUSH_SIZE characters.
+	"""
+
+	def __init__(self, write, indent=" "):
+		super().__init__(convert_charrefs=False)
+		self.__write = write
+		self.__indent = indent
+		self.__stack = []
+		self.__text = []
+		self.__buffer = []
+		self.__buffered = 0
+		# Nesting depth inside of pre/textarea, and the raw text element currently open.
+		self.__preserve = 0
+		self.__raw = None
+
+	def __emit(self, value):
+		self.__buffer.append(value)
+		self.__buffered += len(value)
+
+		if self.__buffered >= FLUSH_SIZE:
+			self.flush()
+
+	def __line(self, value):
+		self.__emit(f"{self.__indent * len(self.__stack)}{value}\n")
+
+	def __flush_text(self):
+		if len(self.__text) == 0:
+			return
+
+		text = "".join(self.__text)
+		self.__text = []
+
+		if self.__raw is not None:
+			text = text.lstrip("\n").rstrip()
+			if text != "":
+				self.__emit(f"{text}\n")
+		else:
+			text = " ".join(text.split())
+			if text != "":
+				self.__line(text)
+
+	def __start_text(self, tag, attrs, close=False):
+		parts = [tag]
+		for key, value in attrs:
+			parts.append(key if value is None else f'{key}="{escape_attribute(value)}"')
+
+		return f"<{' '.join(parts)}{'/' if close else ''}>"
+
+	def flush(self):
+		if self.__buffered > 0:
+			self.__write("".join(self.__buffer))
+			self.__buffer = []
+			self.__buffered = 0
+
+	def close(self):
+		super().close()
+		self.__flush_text()
+		self.flush()
+
+	def handle_starttag(self, tag, attrs):
+		if self.__preserve > 0:
+			self.__text.append(self.get_starttag_text())
+			if tag in PRESERVE_ELEMENTS:
+				self.__preserve += 1
+			return
+
+		self.__flush_text()
+
+		closes = IMPLICIT_CLOSE.get(tag)
+		while closes is not None and len(self.__stack) > 0 and self.__stack[-1] in closes:
+			self.__stack.pop()
+
+		if tag in VOID_ELEMENTS:
+			self.__line(self.__start_text(tag, attrs, close=True))
+		elif tag in PRESERVE_ELEMENTS:
+			self.__emit(f"{self.__indent * len(self.__stack)}{self.__start_text(tag, attrs)}")
+			self.__stack.append(tag)
+			self.__preserve = 1
+		else:
+			self.__line(self.__start_text(tag, attrs))
+			self.__stack.append(tag)
+
+			if tag in RAW_TEXT_ELEMENTS:
+				self.__raw = tag
+
+	def handle_startendtag(self, tag, attrs):
+		if self.__preserve > 0:
+			self.__text.append(self.get_starttag_text())
+			return
+
+		self.__flush_text()
+		self.__line(self.__start_text(tag, attrs, close=True))
+
+	def handle_endtag(self, tag):
+		if self.__preserve > 0:
+			if tag in PRESERVE_ELEMENTS:
+				self.__preserve -= 1
+
+			if self.__preserve > 0:
+				self.__text.append(f"</{tag}>")
+				return
+
+			# Content of a preserved element goes out untouched, directly followed by the end tag.
+			self.__emit("".join(self.__text))
+			self.__text = []
+			self.__stack.pop()
+			self.__emit(f"</{tag}>\n")
+			return
+
+		self.__flush_text()
+		self.__raw = None
+
+		if tag in VOID_ELEMENTS:
+			return
+
+		if tag not in self.__stack:
+			# Stray end tag, keep it where it is without changing the depth.
+			self.__line(f"</{tag}>")
+			return
+
+		while self.__stack[-1] != tag:
+			self.__stack.pop()
+
+		self.__stack.pop()
+		self.__line(f"</{tag}>")
+
+	def handle_data(self, data):
+		self.__text.append(data)
+
+	def handle_entityref(self, name):
+		self.__text.append(f"&{name};")
+
+	def handle_charref(self, name):
+		self.__text.append(f"&#{name};")
+
+	def __markup(self, value):
+		if self.__preserve > 0:
+			self.__text.append(value)
+		else:
+			self.__flush_text()
+			self.__line(value)
+
+	def handle_comment(self, data):
+		self.__markup(f"<!--{data}-->")
+
+	def handle_decl(self, decl):
+		self.__markup(f"<!{decl}>")
+
+	def handle_pi(self, data):
+		self.__markup(f"<?{data}>")
+
+	def unknown_decl(self, data):
+		self.__markup(f"<![{data}]>")
+
+def beautify(source, indent=" "):
+	""" Formats a complete HTML string. """
+	output = []
+	beautifier = HTMLBeautifier(output.append, indent=indent)
+	beautifier.feed(source)
+	beautifier.close()
+
+	return "".join(output)
+
+__all__ = [
+	"HTMLBeautifier",
+	"beautify",
+]
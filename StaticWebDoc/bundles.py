@@ -0,0 +1,206 @@
+"""
+Bundling of module assets: the styles and scripts which the {% extern %} and {% insert %} tags of a page import are
+concatenated into one stylesheet and one script, named by the hash of their content. Pages importing the same assets
+share their bundles, and a bundle that exists already is not written again.
+
+imported_styles() and imported_scripts() print markers, which are replaced by the links of the page once the page
+is complete (the imports of a page are only known after its body has been rendered).
+"""
+
+import hashlib
+import os
+import pathlib
+import re
+import urllib.parse
+
+import StaticWebDoc.assets as assets
+
+STYLES_MARKER = "<!--swd:imported-styles-->"
+SCRIPTS_MARKER = "<!--swd:imported-scripts-->"
+STYLE_SUFFIX = ".css"
+SCRIPT_SUFFIX = ".js"
+# Below the data directory of the render.
+BUNDLE_DIR = "bundles"
+CHUNK_SIZE = 1 << 16
+
+# References of a stylesheet, which are relative to where the stylesheet is served from.
+CSS_REFERENCE = re.compile(r"""(url\(\s*['"]?|@import\s+['"])([^'")\s]+)""")
+# Scripts which can not be bundled: static imports and exports only work at the top level of a module, and import()
+# and import.meta resolve against the url of the module they are in, which would be the bundle.
+MODULE_SYNTAX = re.compile(r"""^\s*(?:import\s*[\w{*'"]|export\b)|\bimport\s*(?:\(|\.\s*meta\b)""", re.MULTILINE)
+# Module specifiers of static imports and exports, and of import() with a string literal.
+MODULE_SPECIFIER = re.compile(r"""(?:\bfrom\s*|^\s*import\s*|\bimport\s*\(\s*)['"]([^'"]+)['"]""", re.MULTILINE)
+
+def absolute_references(css, url):
+	""" Makes the relative references of a stylesheet served from url absolute. """
+	def replace(match):
+		reference = match.group(2)
+		if reference.startswith(("/", "#", "data:")) or "://" in reference:
+			return match.group(0)
+
+		return match.group(1) + urllib.parse.urljoin(url, reference)
+
+	return CSS_REFERENCE.sub(replace, css)
+
+class Bundler:
+	""" Writes bundles to directory, which is served at url. locate maps an asset url to its file, or None. """
+
+	def __init__(self, directory, url, locate):
+		self.__directory = pathlib.Path(directory)
+		self.__url = url
+		self.__locate = locate
+
+	def bundle(self, urls, suffix):
+		"""
+		Bundles the assets at urls. Returns the urls to link in their place, each with whether it is a bundle, and
+		the files that went into the bundles. Assets which can not be bundled are linked as they are: those without a
+		file, scripts using imports, exports or import.meta, and scripts which those import (a module only runs once
+		per url, but the copy in the bundle would run as well). They split the bundles, so that everything still runs
+		(or applies) in the order it was imported.
+		"""
+		links = []
+		sources = []
+		parts = []
+		texts = {}
+
+		for url in urls:
+			source = self.__locate(url)
+			if source is not None and source.is_file():
+				texts[url] = (source, source.read_text(encoding="utf-8"))
+
+		if suffix == SCRIPT_SUFFIX:
+			modules = { url for url, (_, text) in texts.items() if MODULE_SYNTAX.search(text) is not None }
+			imported = self.__imports(modules, texts)
+		else:
+			modules = imported = set()
+
+		for url in urls:
+			if url not in texts or url in modules or url in imported:
+				if len(parts) > 0:
+					links.append((self.__write_bundle(parts, suffix), True))
+					parts = []
+
+				links.append((url, False))
+				continue
+
+			source, text = texts[url]
+
+			if suffix == STYLE_SUFFIX:
+				parts.append(f"/* {url} */\n{absolute_references(text, url)}\n")
+			else:
+				# Every script runs in a function of its own, so that its top level declarations (var included) stay
+				# its own, as they would in a module of its own. Async, since modules can use await at the top level.
+				parts.append(f"// {url}\nawait (async () => {{\n{text}\n}})();\n")
+
+			sources.append(source)
+
+		if len(parts) > 0:
+			links.append((self.__write_bundle(parts, suffix), True))
+
+		return links, sources
+
+	def __write_bundle(self, parts, suffix):
+		""" Writes a bundle of parts, named after its content, and returns its url. """
+		content = "".join(parts).encode("utf-8")
+		name = f"{hashlib.blake2b(content, digest_size=assets.FINGERPRINT_SIZE).hexdigest()}{suffix}"
+
+		self.__write(self.__directory/name, content)
+		return f"{self.__url}/{name}"
+
+	def __imports(self, urls, texts):
+		""" The urls the modules at urls import, directly or through the modules they import. """
+		imported = set()
+		pending = list(urls)
+
+		while len(pending) > 0:
+			url = pending.pop()
+			if url in texts:
+				text = texts[url][1]
+			else:
+				source = self.__locate(url)
+				if source is None or not source.is_file():
+					continue
+
+				text = source.read_text(encoding="utf-8")
+
+			for specifier in MODULE_SPECIFIER.findall(text):
+				# Bare specifiers name packages of an import map, which are never bundled.
+				if not specifier.startswith(("/", "./", "../")):
+					continue
+
+				target = urllib.parse.urljoin(url, specifier)
+				if target not in imported:
+					imported.add(target)
+					pending.append(target)
+
+		return imported
+
+	def __write(self, path, content):
+		if path.exists():
+			return
+
+		path.parent.mkdir(parents=True, exist_ok=True)
+
+		# Render workers may write the same bundle at once.
+		temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+		with open(temporary, "wb") as f:
+			f.write(content)
+
+		os.replace(temporary, path)
+
+def marker_replacer(replacements):
+	"""
+	The pattern matching the markers of replacements, and the function replacing a match. Replacements are formatted
+	like the page, and take the indentation of the marker they replace (a beautified page has every tag on a line of
+	its own); a marker replaced with nothing is removed together with its line.
+	"""
+	pattern = re.compile(f"([ \t]*)({'|'.join(map(re.escape, replacements))})(\n?)")
+
+	def replace(match):
+		indent, marker, newline = match.groups()
+		value = replacements[marker]
+		if value == "":
+			return ""
+
+		return indent + value.replace("\n", "\n" + indent) + newline
+
+	return pattern, replace
+
+def link_markers(page, replacements):
+	""" Replaces every marker of page with its replacement. """
+	pattern, replace = marker_replacer(replacements)
+	return pattern.sub(replace, page)
+
+def replace_markers(source, target, replacements, chunk_size=CHUNK_SIZE):
+	""" Copies the page at source to target, a chunk at a time, replacing every marker with its replacement. """
+	pattern, replace = marker_replacer(replacements)
+	tail = ""
+
+	with open(source, "r") as src, open(target, "w") as dst:
+		while True:
+			chunk = src.read(chunk_size)
+			data = tail + chunk
+
+			if chunk == "":
+				dst.write(pattern.sub(replace, data))
+				break
+
+			# Markers start with the only < they contain, so a marker that is cut off starts at the last <. Its
+			# indentation stays with it.
+			index = data.rfind("<")
+			if index < 0:
+				index = len(data)
+
+			while index > 0 and data[index - 1] in " \t":
+				index -= 1
+
+			dst.write(pattern.sub(replace, data[:index]))
+			tail = data[index:]
+
+__all__ = [
+	"Bundler",
+	"link_markers",
+	"replace_markers",
+	"STYLES_MARKER",
+	"SCRIPTS_MARKER",
+]
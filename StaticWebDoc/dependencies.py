@@ -0,0 +1,271 @@
+"""
+Keeps track of what every rendered template depended upon during the last build, so that later builds only need to
+render the templates whose sources, or whose upstream templates, have changed.
+"""
+
+import hashlib
+import os
+import pathlib
+import orjson
+
+GRAPH_VERSION = 1
+
+def file_digest(path):
+	with open(path, 'rb') as f:
+		return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+class TemplateNode:
+	"""
+	The recorded dependencies of a single renderable template.
+
+	- sources: Every template file that was loaded (extends, include, import, extern and insert).
+	- fields: Every template whose fields were looked up through get_field/link_to or env_data.
+	- listing: Whether or not the template listed the template tree through iter_template.
+	- bundles: The file names of the bundles of module assets the page links (see StaticWebDoc.bundles).
+	"""
+
+	def __init__(self, sources=(), fields=(), listing=False, bundles=()):
+		self.sources = set(sources)
+		self.fields = set(fields)
+		self.listing = listing
+		self.bundles = set(bundles)
+
+	def json(self):
+		return {
+			"sources": sorted(self.sources),
+			"fields": sorted(self.fields),
+			"listing": self.listing,
+			"bundles": sorted(self.bundles)
+		}
+
+class DependencyGraph:
+	def __init__(self, path):
+		self.__path = pathlib.Path(path)
+		self.__signature = None
+		self.__nodes = {}
+		# Maps a source filename to [mtime_ns, size, digest] as of the last time it was used.
+		self.__sources = {}
+		self.__checked = {}
+		self.__refreshed = set()
+		self.__removed = set()
+
+		self.load()
+
+	@property
+	def path(self):
+		return self.__path
+
+	@property
+	def nodes(self):
+		return self.__nodes
+
+	@property
+	def sources(self):
+		return self.__sources.keys()
+
+	@property
+	def removed(self):
+		""" Templates of the last build which no longer exist, as of the last call to stale_templates(). """
+		return self.__removed
+
+	def mtimes(self):
+		""" Maps every recorded source to its modification time as of the last time it was used. """
+		return { filename: state[0] for filename, state in self.__sources.items() }
+
+	def load(self):
+		if not self.__path.exists():
+			return
+
+		with open(self.__path, 'rb') as f:
+			state = orjson.loads(f.read())
+
+		if state.get("version") != GRAPH_VERSION:
+			return
+
+		self.__signature = state["signature"]
+		self.__sources = state["sources"]
+		self.__nodes = { name: TemplateNode(**node) for name, node in state["templates"].items() }
+
+	def save(self, signature):
+		self.__signature = signature
+		self.__path.parent.mkdir(exist_ok=True, parents=True)
+
+		state = {
+			"version": GRAPH_VERSION,
+			"signature": signature,
+			"sources": self.__sources,
+			"templates": { name: node.json() for name, node in self.__nodes.items() }
+		}
+
+		with open(self.__path, 'wb') as output:
+			output.write(orjson.dumps(state))
+
+		self.__checked = {}
+		self.__refreshed = set()
+
+	def begin(self, template):
+		""" Clears the recorded dependencies of a template that is about to be rendered again. """
+		self.__nodes[template] = TemplateNode()
+
+	def add_source(self, template, filename):
+		if filename is None:
+			return
+
+		self.__nodes[template].sources.add(filename)
+
+		if filename not in self.__refreshed:
+			self.__refreshed.add(filename)
+			stat = os.stat(filename)
+			previous = self.__sources.get(filename)
+
+			if previous is None or previous[:2] != [stat.st_mtime_ns, stat.st_size]:
+				self.__sources[filename] = [stat.st_mtime_ns, stat.st_size, file_digest(filename)]
+
+	def add_field(self, template, target):
+		self.__nodes[template].fields.add(target)
+
+	def add_listing(self, template):
+		self.__nodes[template].listing = True
+
+	def add_bundle(self, template, name):
+		self.__nodes[template].bundles.add(name)
+
+	def bundles(self):
+		""" The bundles linked by the pages of every template. """
+		return { name for node in self.__nodes.values() for name in node.bundles }
+
+	def used_sources(self):
+		""" The sources loaded by the pages of every template. """
+		return { filename for node in self.__nodes.values() for filename in node.sources }
+
+	def source_changed(self, filename):
+		if filename in self.__checked:
+			return self.__checked[filename]
+
+		previous = self.__sources.get(filename)
+
+		try:
+			stat = os.stat(filename)
+		except FileNotFoundError:
+			changed = True
+		else:
+			if previous is None:
+				changed = True
+			elif previous[:2] == [stat.st_mtime_ns, stat.st_size]:
+				changed = False
+			else:
+				# The file was touched, but only count it as changed if its content differs.
+				digest = file_digest(filename)
+				changed = digest != previous[2]
+
+				if not changed:
+					self.__sources[filename] = [stat.st_mtime_ns, stat.st_size, digest]
+
+		self.__checked[filename] = changed
+		return changed
+
+	def export(self, templates):
+		""" Returns the recorded state of the given templates, so that it can be merged into another graph. """
+		nodes = { name: self.__nodes[name].json() for name in templates if name in self.__nodes }
+		sources = {}
+
+		for node in nodes.values():
+			for filename in node["sources"]:
+				if filename in self.__sources:
+					sources[filename] = self.__sources[filename]
+
+		return { "nodes": nodes, "sources": sources }
+
+	def merge(self, state):
+		self.__sources.update(state["sources"])
+		self.__refreshed.update(state["sources"])
+
+		for name, node in state["nodes"].items():
+			self.__nodes[name] = TemplateNode(**node)
+
+	def schedule(self, templates):
+		"""
+		Splits the templates into waves, where the templates of a wave only look up fields of templates from
+		earlier waves (as far as the previous build knows). Templates which have not been seen before go into the
+		first wave.
+		"""
+		templates = list(templates)
+		pending = set(templates)
+		levels = {}
+
+		def level(template, visiting):
+			if template in levels:
+				return levels[template]
+
+			node = self.__nodes.get(template)
+			visiting.add(template)
+
+			value = 0
+			if node is not None:
+				for target in node.fields:
+					if target in pending and target not in visiting:
+						value = max(value, level(target, visiting) + 1)
+
+			visiting.discard(template)
+			levels[template] = value
+			return value
+
+		waves = {}
+		for template in templates:
+			waves.setdefault(level(template, set()), []).append(template)
+
+		return [waves[i] for i in sorted(waves)]
+
+	def dependents(self):
+		""" Returns a mapping of templates to the templates that looked up their fields. """
+		result = {}
+		for name, node in self.__nodes.items():
+			for target in node.fields:
+				result.setdefault(target, set()).add(name)
+
+		return result
+
+	def stale_templates(self, templates, signature):
+		"""
+		Returns the set of templates which need to be rendered again. A template is stale when it has not been
+		rendered before, when one of its sources changed, when a template it took fields from is stale or removed,
+		or when it lists the template tree and templates have been added or removed.
+		"""
+		self.__checked = {}
+		self.__refreshed = set()
+
+		templates = set(templates)
+		known = set(self.__nodes)
+		removed = known - templates
+		self.__removed = removed
+
+		for template in removed:
+			del self.__nodes[template]
+
+		if signature != self.__signature:
+			return templates
+
+		stale = set()
+		for template in templates:
+			node = self.__nodes.get(template)
+			if node is None or any(map(self.source_changed, node.sources)):
+				stale.add(template)
+
+		if templates != known:
+			stale.update(t for t in templates & known if self.__nodes[t].listing)
+
+		dependents = self.dependents()
+		queue = list(stale | removed)
+
+		while len(queue) > 0:
+			for template in dependents.pop(queue.pop(), ()):
+				if template in templates and template not in stale:
+					stale.add(template)
+					queue.append(template)
+
+		return stale
+
+__all__ = [
+	"DependencyGraph",
+	"TemplateNode",
+]
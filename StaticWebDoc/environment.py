@@ -1,4 +1,103 @@
 import jinja2
+import hashlib
+import os
+import pathlib
+
+import StaticWebDoc.profiling as profiling
+
+# Needs to change whenever one of the extensions changes the code it compiles templates to.
+BYTECODE_VERSION = 2
 
 class CustomEnvironment(jinja2.Environment):
-	""" Custom environment for this type of project. """
\ No newline at end of file
+	""" Custom environment for this type of project. """
+
+	def _load_template(self, name, globals):
+		project = getattr(self, "project", None)
+
+		# Loading includes compiling the template, or reading it from the compiled template cache.
+		with profiling.phase(None if project is None else project.profiler, "load", name):
+			template = super()._load_template(name, globals)
+
+		# Every extends/include/import (and so every extern/insert) goes through here, which lets the project
+		# record which sources the template currently being rendered depends upon.
+		if project is not None:
+			project.add_dependency(template.filename)
+
+		return template
+
+class CompiledTemplateCache(jinja2.FileSystemBytecodeCache):
+	"""
+	On disk cache of compiled templates, shared by project and @module templates since both are loaded through
+	CustomLoader. Jinja already stores a checksum of the template source in every bucket; the cache key adds the
+	Jinja version, the extension set (and BYTECODE_VERSION) and the lexer settings of the environment, since the
+	compiled code depends upon all of them.
+	"""
+
+	def __init__(self, directory, environment):
+		self.__directory = pathlib.Path(directory)
+		self.__directory.mkdir(exist_ok=True, parents=True)
+
+		super().__init__(str(self.__directory))
+		self.__environment = environment
+		self.__salt = None
+
+	@property
+	def salt(self):
+		if self.__salt is None:
+			env = self.__environment
+			settings = [
+				str(BYTECODE_VERSION),
+				jinja2.__version__,
+				*sorted(env.extensions),
+				env.block_start_string, env.block_end_string,
+				env.variable_start_string, env.variable_end_string,
+				env.comment_start_string, env.comment_end_string,
+				str(env.line_statement_prefix), str(env.line_comment_prefix),
+				str(env.trim_blocks), str(env.lstrip_blocks),
+				env.newline_sequence, str(env.keep_trailing_newline),
+				str(env.optimized)
+			]
+			self.__salt = "|".join(settings)
+
+		return self.__salt
+
+	def get_cache_key(self, name, filename=None):
+		# The salt and the source lead the key, so that prune() can tell which buckets are still in use.
+		digest = hashlib.sha1(f"{self.salt}|{name}|{filename}".encode("utf-8"))
+		return f"{self.__source_prefix(filename)}-{digest.hexdigest()}"
+
+	def __source_prefix(self, filename):
+		salt = hashlib.sha1(self.salt.encode("utf-8")).hexdigest()[:16]
+		source = hashlib.sha1(str(filename).encode("utf-8")).hexdigest()[:16]
+		return f"{salt}-{source}"
+
+	def prune(self, filenames):
+		"""
+		Removes the buckets of every template not loaded from one of filenames, and those compiled with other
+		settings (see salt), which no build would ever read again. Returns the number of removed buckets.
+		"""
+		prefixes = { self.__source_prefix(filename) for filename in filenames }
+		head, tail = self.pattern.split("%s")
+		removed = 0
+
+		for path in self.__directory.glob(self.pattern % "*"):
+			key = path.name[len(head):len(path.name) - len(tail)]
+
+			if key.rsplit("-", 1)[0] not in prefixes:
+				path.unlink(missing_ok=True)
+				removed += 1
+
+		return removed
+
+	def dump_bytecode(self, bucket):
+		# Write to a temporary file first, so that parallel render workers never read a partially written bucket.
+		filename = self._get_cache_filename(bucket)
+		temporary = f"{filename}.{os.getpid()}.tmp"
+
+		# The cache directory may have been removed (e.g. by a clean) since the project was created.
+		self.__directory.mkdir(exist_ok=True, parents=True)
+
+		with open(temporary, "wb") as f:
+			bucket.write_bytecode(f)
+
+		os.replace(temporary, filename)
@@ -13,6 +13,8 @@ class RenderError(Exception):
 	""" Exception raised during rendering to keep track of template render errors. """
 
 	def __init__(self, template, parent=None):
+		# Passing the arguments along keeps the error picklable, so it can be raised from render workers.
+		super().__init__(template, parent)
 		self.__template = template
 		self.__parent = parent
 
@@ -32,7 +34,17 @@ class RenderError(Exception):
 			if isinstance(self.__parent, jinja2.TemplateError):
 				return f"While rendering {self.__template} encountered error: {get_jinja_message(self.__parent)}"
 			else:
-				return f"While rendering {self.__template} encountered error: [{type(self.__parent).__name__}] {self.__parent.message}"
+				return f"While rendering {self.__template} encountered error: [{type(self.__parent).__name__}] {getattr(self.__parent, 'message', self.__parent)}"
 
 	def __str__(self):
-		return f"RenderErrors(message={self.message})"
\ No newline at end of file
+		return f"RenderErrors(message={self.message})"
+
+class RenderDeferred(Exception):
+	"""
+	Raised inside of a render worker when a template needs the fields of a template that another worker renders,
+	so that the main process renders it once the workers are done, instead of rendering the other template twice.
+	"""
+
+	def __init__(self, template):
+		super().__init__(template)
+		self.template = template
@@ -1,14 +1,67 @@
 import jinja2
 import orjson
+import concurrent.futures
 
 import StaticWebDoc as SWD
 import StaticWebDoc.utils as utils
+import StaticWebDoc.bundles as bundles
+import collections
 import dataclasses
+import functools
+import hashlib
+import types
 import typing
 import pathlib
+import os
+import pickle
+import shutil
 
 from jinja2 import nodes
 
+EMBEDDED_DATA_FILE = "embedded_data.json"
+# Kept in the cache directory: where the data of every template is in the embedded data file written last.
+EMBEDDED_SEGMENT_FILE = "embedded_segments.json"
+EMBEDDED_SEPARATOR = b',\n'
+# Lists the shards of every template when the embedded data is sharded, see EmbeddedData.write().
+EMBEDDED_INDEX_FILE = "embedded_index.json"
+# Objects shared by the data of several templates when the embedded data is interned, see EmbeddedData.write().
+EMBEDDED_OBJECTS_FILE = "embedded_objects.json"
+EMBEDDED_REFERENCE = "$ref"
+# Serialized objects shorter than this are repeated rather than referenced.
+INTERN_MIN_SIZE = 32
+# Marks the embedded data file as written interned, in place of the JSON flags it was written with.
+INTERNED = "interned"
+STRUCTURE_FILE = "structure.json"
+# Threads writing the data files of SimpleCache.write().
+WRITE_THREADS = 8
+
+def write_if_changed(path, value):
+	"""
+	Writes value to path unless the file already holds exactly that, which keeps the modification time of unchanged
+	data files (so packaging and HTTP caches see them as unchanged). Returns whether the file was written. The file
+	is replaced rather than written in place, so a package hardlinking it keeps the content it was packaged with.
+	"""
+	try:
+		if path.stat().st_size == len(value):
+			with open(path, 'rb') as f:
+				if f.read() == value:
+					return False
+	except FileNotFoundError:
+		path.parent.mkdir(parents=True, exist_ok=True)
+
+	temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+	try:
+		with open(temporary, 'wb') as output:
+			output.write(value)
+
+		os.replace(temporary, path)
+	except BaseException:
+		temporary.unlink(missing_ok=True)
+		raise
+
+	return True
+
 class DataExtensionObject:
 	"""
 	This is used as a marker type for extension data to determine whether or not it needs to be written to the
@@ -44,25 +97,93 @@ def callable(fn):
 		fn.callable_name = fn.__name__
 		return fn
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class JSONValue:
 	value: typing.Any
 
-class JSON:
-	def json(self):
-		serial = { "type": type(self).__name__ }
+# Serializers of JSON classes, compiled on first use (see serializer()).
+SERIALIZERS = {}
 
-		if dataclasses.is_dataclass(self):
-			value = dataclasses.asdict(self)
-			serial = {**serial, **value}
+def serializer(cls):
+	""" Returns the function converting instances of the JSON class cls into the value that orjson serializes. """
+	try:
+		return SERIALIZERS[cls]
+	except KeyError:
+		SERIALIZERS[cls] = compile_serializer(cls)
+		return SERIALIZERS[cls]
+
+def compile_serializer(cls):
+	"""
+	Dataclasses emit their fields. Other classes emit their JSONValue attributes: only the attributes of the class
+	which can hold one (JSONValues, properties and slots) and those of the instance are looked at, instead of
+	everything dir() lists. Either way the output is the same as walking dir() and calling dataclasses.asdict().
+	"""
+	name = cls.__name__
+
+	if dataclasses.is_dataclass(cls):
+		fields = tuple(field.name for field in dataclasses.fields(cls))
+
+		# Nested values are left to orjson, which serializes dataclasses, lists and dicts the same way asdict() does
+		# without copying them first.
+		def serialize(obj):
+			serial = { "type": name }
+			for field in fields:
+				serial[field] = getattr(obj, field)
+
+			return serial
+
+		return serialize
+
+	# The attributes are not known up front when the class decides what dir() lists.
+	if cls.__dir__ is not object.__dir__:
+		return serialize_attributes
+
+	candidates = set()
+	for base in cls.__mro__:
+		for attr, value in vars(base).items():
+			if isinstance(value, (JSONValue, property, functools.cached_property, types.MemberDescriptorType)):
+				candidates.add(attr)
+
+	static = [(attr, False) for attr in sorted(candidates)]
+	# Attributes to look at by the attributes of the instance, in the (sorted) order of dir(), and whether their
+	# value can be read from the instance dictionary (unless a property or slot of the class takes precedence).
+	orders = {}
+
+	def serialize(obj):
+		serial = { "type": name }
+		instance = getattr(obj, "__dict__", None)
+
+		if instance:
+			keys = tuple(instance)
+			attrs = orders.get(keys)
+			if attrs is None:
+				attrs = orders[keys] = [(attr, attr not in candidates) for attr in sorted(candidates.union(keys))]
 		else:
-			for attr in dir(self):
-				obj = getattr(self, attr)
-				if isinstance(obj, JSONValue):
-					serial[attr] = obj.value
+			attrs = static
+
+		for attr, own in attrs:
+			value = instance[attr] if own else getattr(obj, attr)
+			if isinstance(value, JSONValue):
+				serial[attr] = value.value
 
 		return serial
 
+	return serialize
+
+def serialize_attributes(obj):
+	serial = { "type": type(obj).__name__ }
+
+	for attr in dir(obj):
+		value = getattr(obj, attr)
+		if isinstance(value, JSONValue):
+			serial[attr] = value.value
+
+	return serial
+
+class JSON:
+	def json(self):
+		return serializer(type(self))(self)
+
 class ObjectAsArray:
 	"""
 	Mark class used to update object data and store it in an array even when set as a singular object.
@@ -74,11 +195,25 @@ class JSONEnumValue(JSON):
 		return self.name
 
 class JSONEncoder:
+	""" Default function for orjson. Looks up how to encode each type once, instead of on every object. """
+
+	def __init__(self):
+		self.__encoders = {}
+
 	def __call__(self, obj):
-		if isinstance(obj, JSON):
-			return obj.json()
-		elif isinstance(obj, set):
-			return list(obj)
+		cls = type(obj)
+		encode = self.__encoders.get(cls)
+
+		if encode is None:
+			encode = self.__encoders[cls] = self.__encoder(cls)
+
+		return encode(obj)
+
+	def __encoder(self, cls):
+		if issubclass(cls, JSON):
+			return serializer(cls) if cls.json is JSON.json else cls.json
+		elif issubclass(cls, set):
+			return list
 		else:
 			raise TypeError
 
@@ -86,6 +221,10 @@ class SimpleCache(JSON, DataExtensionObject):
 	def __init__(self, env):
 		self.__env = env
 		self.__cache = {}
+		# Templates whose entries changed since the last write, and the files listed by the structure written last.
+		self.__modified = set()
+		self.__structure = None
+		self.__listed = set()
 
 	@property
 	def env(self):
@@ -128,54 +267,168 @@ class SimpleCache(JSON, DataExtensionObject):
 			self.__cache[template[0]] = {}
 
 		self.__cache[template[0]][template[1]] = data
+		self.__modified.add(template[0])
 
 	def set_field(self, template, data):
 		self[template] = data
 
+	@property
+	def cache_file(self):
+		return f"{self.data_prefix}.json"
+
+	def owner(self, key):
+		""" Returns the name of the template that produced the given cache key. """
+		return key
+
+	def persist(self, cache_path):
+		""" Stores the cache so the entries of unchanged templates can be restored by the next build. """
+		with open(cache_path/self.cache_file, 'wb') as output:
+			output.write(orjson.dumps(self.__cache, default=JSONEncoder()))
+
+	def restore(self, cache_path, stale):
+		""" Restores the entries of the previous build, except for those of templates that will be rendered again. """
+		path = cache_path/self.cache_file
+
+		if not path.exists():
+			return
+
+		with open(path, 'rb') as f:
+			previous = orjson.loads(f.read())
+
+		for key, data in previous.items():
+			if self.owner(key) not in stale:
+				self.__cache[key] = self.decode(data)
+
+	def discard(self, stale):
+		""" Drops the entries of templates that will be rendered again. """
+		for key in [k for k in self.__cache if self.owner(k) in stale]:
+			del self.__cache[key]
+			self.__modified.add(key)
+
+	def decode(self, data):
+		""" Converts an entry loaded back from JSON into the form it is used in while rendering. """
+		return data
+
+	def export(self, include):
+		"""
+		Returns the entries of every template accepted by include as plain JSON values, grouped by template. Used
+		to send the results of a render worker back to the main process.
+		"""
+		encoder = JSONEncoder()
+		exported = {}
+
+		for key, data in self.__cache.items():
+			owner = self.owner(key)
+			if include(owner):
+				exported.setdefault(owner, {})[key] = orjson.loads(orjson.dumps(data, default=encoder))
+
+		return exported
+
+	def merge(self, entries):
+		for key, data in entries.items():
+			self.__cache[key] = self.decode(data)
+			self.__modified.add(key)
+
 	def json(self):
 		return self.__cache
 
 	def write(self, data_path):
-		#directories = {}
-		structure = { "type": "dir", "files": {}}
+		"""
+		Writes the entries of every template to <data_prefix>/<template>.json, and the tree of those files to
+		structure.json. Entries which did not change since the last write are not serialized again, and files
+		which already hold the same bytes are not written again.
+		"""
+		data_path = data_path/self.data_prefix
+		encoder = JSONEncoder()
+		files = {}
 
-		def add_file(file):
-			# If it is a file
-			section = structure
-			parts = file.parts
+		for (template, data) in self.cache.items():
+			path = (data_path/template).with_suffix(".json")
+			files[path.relative_to(data_path).as_posix()] = template
+
+		writes = {}
+		for (file, template) in files.items():
+			path = data_path/file
+			if template in self.__modified or not path.exists():
+				writes[path] = orjson.dumps(
+					self.cache[template],
+					option=self.env.project.json_flags,
+					default=encoder)
 
-			for i, p in enumerate(parts):
-				if p not in section["files"]:
-					if i == len(parts) - 1:
-						section["files"][p] = { "type": "file", "name": p}
-					else:
-						section["files"][p] = { "type": "dir", "files": {}, "name": p}
+		for directory in sorted({ path.parent for path in writes }):
+			directory.mkdir(parents=True, exist_ok=True)
 
-				section = section["files"][p]
+		if len(writes) > 0:
+			with concurrent.futures.ThreadPoolExecutor(WRITE_THREADS) as pool:
+				list(pool.map(write_if_changed, writes.keys(), writes.values()))
 
+		self.__write_structure(data_path, set(files))
+		self.__modified = set()
 
+	def __write_structure(self, data_path, files):
+		""" Updates the tree of data files with the files added and removed since the last write. """
+		if self.__structure is None:
+			self.__structure, self.__listed = self.__read_structure(data_path/STRUCTURE_FILE)
 
-		data_path = data_path/self.data_prefix
+		for file in sorted(self.__listed - files):
+			path = data_path/file
+			path.unlink(missing_ok=True)
+			self.__remove_file(pathlib.PurePosixPath(file).parts)
 
-		for (template, data) in self.cache.items():
+			for parent in path.parents:
+				if parent == data_path or any(parent.iterdir()):
+					break
+				parent.rmdir()
 
-			path = (data_path/template).with_suffix(".json")
-			add_file(path.relative_to(data_path))
-			path.parent.mkdir(parents=True, exist_ok=True)
+		for file in sorted(files - self.__listed):
+			self.__add_file(pathlib.PurePosixPath(file).parts)
 
-			with open(path, 'wb') as output:
-				encoder = JSONEncoder()
-				value = orjson.dumps(
-					data,
-					option=self.env.project.json_flags,
-					default=encoder)
-				output.write(value)
+		self.__listed = files
+		data_path.mkdir(parents=True, exist_ok=True)
+		write_if_changed(data_path/STRUCTURE_FILE, orjson.dumps(self.__structure, option=orjson.OPT_INDENT_2))
+
+	def __read_structure(self, path):
+		try:
+			with open(path, 'rb') as f:
+				structure = orjson.loads(f.read())
+		except (FileNotFoundError, orjson.JSONDecodeError):
+			return { "type": "dir", "files": {}}, set()
+
+		listed = set()
+		def walk(section, parts):
+			for (name, entry) in section["files"].items():
+				if entry["type"] == "dir":
+					walk(entry, parts + [name])
+				else:
+					listed.add("/".join(parts + [name]))
+
+		walk(structure, [])
+		return structure, listed
+
+	def __add_file(self, parts):
+		section = self.__structure
+
+		for i, p in enumerate(parts):
+			if p not in section["files"]:
+				if i == len(parts) - 1:
+					section["files"][p] = { "type": "file", "name": p}
+				else:
+					section["files"][p] = { "type": "dir", "files": {}, "name": p}
+
+			section = section["files"][p]
+
+	def __remove_file(self, parts):
+		sections = [self.__structure]
+		for p in parts[:-1]:
+			sections.append(sections[-1]["files"][p])
 
-		files = list(data_path.rglob("*"))
-		files.append(data_path)
+		del sections[-1]["files"][parts[-1]]
 
-		with open(data_path/"structure.json", 'wb') as output:
-			output.write(orjson.dumps(structure, option=orjson.OPT_INDENT_2))
+		# Drop the directories left empty.
+		for section, p in reversed(list(zip(sections[:-1], parts[:-1]))):
+			if len(section["files"][p]["files"]) > 0:
+				break
+			del section["files"][p]
 
 
 
@@ -184,10 +437,48 @@ class FragmentCache(SimpleCache, HasCallables):
 	A Cache of HTML strings that can be referenced by other templates when rendering.
 	"""
 
+	def __init__(self, env):
+		super().__init__(env)
+		self.__previous_path = None
+		self.__previous = None
+		self.__fresh = set()
+
 	@property
 	def data_prefix(self):
 		return "fields"
 
+	@property
+	def cache_file(self):
+		return self.env.project.cache_file
+
+	def decode(self, data):
+		# Fields are rendered HTML, so they should not be escaped again when reused.
+		return { key: jinja2.filters.Markup(value) for key, value in data.items() }
+
+	def serve_previous(self, cache_path, fresh):
+		"""
+		Lets get_field answer lookups of fresh templates (those whose sources and upstream templates have the same
+		content hashes as in the previous build) with the fields of the previous build, instead of rendering them
+		on the spot. The previous fields are only read once a lookup misses.
+		"""
+		self.__previous_path = cache_path/self.cache_file
+		self.__previous = None
+		self.__fresh = fresh
+
+	def __load_previous(self, template):
+		if template not in self.__fresh:
+			return
+
+		if self.__previous is None:
+			self.__previous = {}
+
+			if self.__previous_path.exists():
+				with open(self.__previous_path, 'rb') as f:
+					self.__previous = orjson.loads(f.read())
+
+		if template in self.__previous:
+			self.merge({ template: self.__previous[template] })
+
 	@callable
 	def link_to(self, template_name, display=None):
 		inpath = pathlib.Path(template_name)
@@ -195,6 +486,8 @@ class FragmentCache(SimpleCache, HasCallables):
 		if inpath.suffix != SWD.TEMPLATE_EXTENSION:
 			template_name += SWD.TEMPLATE_EXTENSION
 
+		self.env.project.add_field_dependency(template_name)
+
 		if display is None:
 			display = self.get_field(template_name, "name")
 
@@ -210,6 +503,11 @@ class FragmentCache(SimpleCache, HasCallables):
 		if checkpath.suffix != SWD.TEMPLATE_EXTENSION:
 			template += SWD.TEMPLATE_EXTENSION
 
+		self.env.project.add_field_dependency(template)
+
+		if template not in self.cache:
+			self.__load_previous(template)
+
 		if template not in self.cache:
 			self.env.project.request_render(template)
 
@@ -263,11 +561,31 @@ class EmbeddedData(SimpleCache):
 	def __init__(self, env):
 		super().__init__(env)
 		self.__current_env = None
+		# Offset and length of the data of every template in the embedded data file written last, and the size,
+		# mtime and JSON flags of that file (to tell whether it is still the same file).
+		self.__segments = {}
+		self.__written = None
+		# False once the file holds data of a template which changed or was removed, so it can not be appended to.
+		self.__appendable = True
+		# Templates whose data changed since the last write.
+		self.__modified = set()
+		# Digests of the objects in the data of every template, counted when interning.
+		self.__digests = {}
+		# Templates whose data are the objects their data tags set, rather than the JSON values of those objects
+		# (restored from the previous build), which lose the types of project objects.
+		self.__live = set()
 
 	@property
 	def data_prefix(self):
 		return "objects"
 
+	@property
+	def cache_file(self):
+		return self.env.project.object_file
+
+	def owner(self, key):
+		return key + SWD.TEMPLATE_EXTENSION
+
 	@property
 	def data_env(self):
 		if self.__current_env is None:
@@ -289,33 +607,383 @@ class EmbeddedData(SimpleCache):
 			}
 
 		self.cache[template[0]][self.data_env][template[1]] = data
+		self.__changed(template[0])
+		self.__live.add(template[0])
 
 	def set_field(self, template, data_env, key, data):
 		self.cache[template][data_env][key] = data
+		self.__changed(template)
+		self.__live.add(template)
+
+	def is_live(self, template):
+		""" Whether the data of template are the objects its data tags set, see Project.env_data(). """
+		return template in self.__live
+
+	def __changed(self, template):
+		self.__modified.add(template)
+		self.__digests.pop(template, None)
+
+		if self.__segments.pop(template, None) is not None:
+			self.__appendable = False
+
+	def export(self, include):
+		"""
+		Pickles the data of every template accepted by include, so that the main process gets the objects themselves
+		rather than their JSON values. Data which can not be pickled is exported as JSON values, see is_live().
+		"""
+		encoder = JSONEncoder()
+		exported = {}
+
+		for key, data in self.cache.items():
+			owner = self.owner(key)
+			if not include(owner):
+				continue
+
+			value = None
+			if key in self.__live:
+				try:
+					value = pickle.dumps(data)
+				except (pickle.PicklingError, TypeError, AttributeError):
+					pass
+
+			if value is None:
+				value = orjson.loads(orjson.dumps(data, default=encoder))
+
+			exported.setdefault(owner, {})[key] = value
+
+		return exported
+
+	def decode(self, data):
+		return pickle.loads(data) if isinstance(data, bytes) else data
+
+	def merge(self, entries):
+		for key, data in entries.items():
+			self.__changed(key)
+
+			# JSON values never decode to bytes.
+			if isinstance(data, bytes):
+				self.__live.add(key)
+			else:
+				self.__live.discard(key)
+
+		super().merge(entries)
+
+	def discard(self, stale):
+		for key in [k for k in self.cache if self.owner(k) in stale]:
+			self.__changed(key)
+			self.__live.discard(key)
+
+		super().discard(stale)
+
+	def persist(self, cache_path):
+		super().persist(cache_path)
+
+		with open(cache_path/EMBEDDED_SEGMENT_FILE, 'wb') as output:
+			output.write(orjson.dumps({ "file": self.__written, "segments": self.__segments }))
+
+	def restore(self, cache_path, stale):
+		super().restore(cache_path, stale)
+
+		try:
+			with open(cache_path/EMBEDDED_SEGMENT_FILE, 'rb') as f:
+				previous = orjson.loads(f.read())
+		except (FileNotFoundError, orjson.JSONDecodeError):
+			return
+
+		self.__written = previous["file"]
+		self.__segments = { template: tuple(segment) for template, segment in previous["segments"].items() }
+
+		# The data of templates which will be rendered again was not restored.
+		for template in [t for t in self.__segments if t not in self.cache]:
+			self.__changed(template)
 
 	def get_field(self, template, data_env, key):
 		return self.cache[template][data_env][key]
 
+	def __serialize(self, template, data, encoder, flags=None):
+		""" Raises a RenderError naming the template when its data can not be serialized. """
+		try:
+			return orjson.dumps(
+				data,
+				option=self.env.project.json_flags if flags is None else flags,
+				default=encoder)
+		except Exception as ex:
+			raise SWD.RenderError(self.owner(template), ex) from ex
+
+	def __is_written(self, path, mode=None):
+		""" Whether path is still the file that was written last, so that the recorded segments can be used. """
+		try:
+			stat = path.stat()
+		except FileNotFoundError:
+			return False
+
+		return self.__written == [stat.st_size, stat.st_mtime_ns, self.env.project.json_flags if mode is None else mode]
+
 	def write(self, data_path):
-		values = []
-		for (template, data) in self.cache.items():
-			try:
-				encoder = JSONEncoder()
-				value = orjson.dumps(
-					data,
-					option=self.env.project.json_flags,
-					default=encoder)
-				values.append(value)
-			except Exception as ex:
-				print(f"Failed serializing {template}")
-				raise ex
-
-		concat = b',\n'.join(values)
-		with open(data_path/"embedded_data.json", 'wb') as output:
-			output.write(b'[')
-			output.write(concat)
+		"""
+		Writes the embedded data either to a single embedded_data.json holding the data of every template, or sharded
+		(Project.shard_embedded_data) into one file per template and data section, so a page only needs to load the
+		data it uses, or interned (Project.intern_embedded_data) so that objects held by several templates are only
+		written once.
+		"""
+		if self.env.project.shard_embedded_data:
+			self.__remove_file(data_path/EMBEDDED_DATA_FILE)
+			(data_path/EMBEDDED_OBJECTS_FILE).unlink(missing_ok=True)
+			self.__write_shards(data_path)
+		elif self.env.project.intern_embedded_data:
+			self.__remove_shards(data_path)
+			self.__write_interned(data_path/EMBEDDED_DATA_FILE, data_path/EMBEDDED_OBJECTS_FILE)
+		else:
+			self.__remove_shards(data_path)
+			(data_path/EMBEDDED_OBJECTS_FILE).unlink(missing_ok=True)
+			self.__write_file(data_path/EMBEDDED_DATA_FILE)
+
+		self.__modified = set()
+
+	def __write_file(self, path):
+		"""
+		Streams the data of every template into the embedded data file, one template at a time and ordered by
+		template, so that the file does not depend on the order templates were rendered in. The data of templates
+		which did not change since the file was written last is not serialized again: when templates were only added
+		after the last one in the file their data is appended to it, otherwise the file is written again copying the
+		unchanged data from the previous file.
+		"""
+		if not self.__is_written(path):
+			self.__segments = {}
+			self.__appendable = False
+		elif path.stat().st_nlink > 1:
+			# Appending would change the file of a package which hardlinks it as well, see packaging.sync().
+			self.__appendable = False
+
+		added = sorted(template for template in self.cache if template not in self.__segments)
+
+		if self.__appendable and len(added) > 0 and len(self.__segments) > 0 and added[0] < max(self.__segments):
+			self.__appendable = False
+
+		if self.__appendable:
+			if len(added) > 0:
+				self.__append(path, added)
+		else:
+			self.__rewrite(path)
+
+		stat = path.stat()
+		self.__written = [stat.st_size, stat.st_mtime_ns, self.env.project.json_flags]
+		self.__appendable = True
+
+	def __append(self, path, templates):
+		encoder = JSONEncoder()
+		# Serialized before the file is touched, so that data which can not be serialized leaves it as it was.
+		values = [(template, self.__serialize(template, self.cache[template], encoder)) for template in templates]
+
+		with open(path, 'r+b') as output:
+			# Overwrite the closing bracket.
+			output.seek(-1, os.SEEK_END)
+
+			for template, value in values:
+				if len(self.__segments) > 0:
+					output.write(EMBEDDED_SEPARATOR)
+
+				self.__segments[template] = (output.tell(), len(value))
+				output.write(value)
+
 			output.write(b']')
 
+	def __rewrite(self, path):
+		encoder = JSONEncoder()
+		segments = {}
+		# Written next to the previous file, which still provides the data of unchanged templates.
+		temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+		try:
+			with open(temporary, 'wb') as output:
+				previous = open(path, 'rb') if len(self.__segments) > 0 else None
+
+				try:
+					output.write(b'[')
+
+					for template in sorted(self.cache):
+						if len(segments) > 0:
+							output.write(EMBEDDED_SEPARATOR)
+
+						if template in self.__segments:
+							offset, length = self.__segments[template]
+							previous.seek(offset)
+							value = previous.read(length)
+						else:
+							value = self.__serialize(template, self.cache[template], encoder)
+
+						segments[template] = (output.tell(), len(value))
+						output.write(value)
+
+					output.write(b']')
+				finally:
+					if previous is not None:
+						previous.close()
+
+			os.replace(temporary, path)
+		except BaseException:
+			temporary.unlink(missing_ok=True)
+			raise
+
+		self.__segments = segments
+
+	def __write_interned(self, path, objects_path):
+		"""
+		Writes embedded_data.json with every object that occurs more than once replaced by a reference into the
+		object table embedded_objects.json. The objects considered are the values of {% data %} keys and the
+		elements of list values, when serialized at least INTERN_MIN_SIZE bytes long:
+
+			embedded_objects.json   [<object>, ...]
+			embedded_data.json      [{ <data section>: { <key>: <value> } }, ...]
+
+		A value, or an element of a list value, of the form { "$ref": <n> } is a reference to the object at index
+		n of the table. Objects in the table hold no references themselves. A loader fetches both files and replaces
+		every reference with the object it points to, so that every template shares one copy of the object. Both
+		files are ordered by template, written compact, and only written again when the data of a template changed.
+		"""
+		if len(self.__modified) == 0 and objects_path.exists() and self.__is_written(path, INTERNED):
+			return
+
+		flags = self.env.project.json_flags & ~orjson.OPT_INDENT_2
+		encoder = JSONEncoder()
+		# Only called for the data of the template of the current iteration of the loops below.
+		dumps = lambda value: self.__serialize(template, value, encoder, flags)
+		digest = lambda value: hashlib.blake2b(value, digest_size=16).digest()
+
+		# Only digests are kept between the passes, which keeps the memory used down to the shared objects.
+		counts = collections.Counter()
+		for (template, envs) in self.cache.items():
+			if template not in self.__digests:
+				self.__digests[template] = collections.Counter(
+					digest(value) for value in self.__intern_candidates(envs, dumps))
+
+			counts.update(self.__digests[template])
+
+		ids = {}
+		table = []
+
+		def intern(value):
+			if len(value) < INTERN_MIN_SIZE:
+				return value
+
+			key = digest(value)
+			if counts[key] < 2:
+				return value
+
+			if key not in ids:
+				ids[key] = len(table)
+				table.append(value)
+
+			return orjson.dumps({ EMBEDDED_REFERENCE: ids[key] })
+
+		sort = (lambda items: sorted(items, key=lambda item: item[0])) if flags & orjson.OPT_SORT_KEYS else list
+		temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+		try:
+			with open(temporary, 'wb') as output:
+				output.write(b'[')
+
+				for (i, template) in enumerate(sorted(self.cache)):
+					envs = self.cache[template]
+
+					if i > 0:
+						output.write(EMBEDDED_SEPARATOR)
+
+					sections = []
+					for (data_env, values) in sort(envs.items()):
+						entries = []
+						for (key, value) in sort(values.items()):
+							serialized = dumps(value)
+							interned = intern(serialized)
+
+							# A list that is not shared as a whole can still hold shared elements.
+							if interned is serialized and isinstance(value, list):
+								interned = b'[' + b','.join(intern(dumps(element)) for element in value) + b']'
+
+							entries.append(dumps(key) + b':' + interned)
+
+						sections.append(dumps(data_env) + b':{' + b','.join(entries) + b'}')
+
+					output.write(b'{' + b','.join(sections) + b'}')
+
+				output.write(b']')
+
+			os.replace(temporary, path)
+		except BaseException:
+			temporary.unlink(missing_ok=True)
+			raise
+
+		write_if_changed(objects_path, b'[' + b','.join(table) + b']')
+
+		# The file holds references, so it can not be appended to or copied from by the other modes.
+		stat = path.stat()
+		self.__segments = {}
+		self.__written = [stat.st_size, stat.st_mtime_ns, INTERNED]
+
+	def __intern_candidates(self, envs, dumps):
+		for values in envs.values():
+			for value in values.values():
+				yield dumps(value)
+
+				if isinstance(value, list):
+					for element in value:
+						yield dumps(element)
+
+	def __remove_file(self, path):
+		path.unlink(missing_ok=True)
+		self.__segments = {}
+		self.__written = None
+
+	def __write_shards(self, data_path):
+		"""
+		Writes the data of every data section of every template to objects/<template>.<section>.json, and lists the
+		shards in embedded_index.json as { template: { section: [path, size in bytes] } }, with paths relative to the
+		data directory. Only the shards of templates whose data changed are written again.
+		"""
+		index_path = data_path/EMBEDDED_INDEX_FILE
+
+		try:
+			with open(index_path, 'rb') as f:
+				previous = orjson.loads(f.read())
+		except (FileNotFoundError, orjson.JSONDecodeError):
+			previous = {}
+
+		encoder = JSONEncoder()
+		index = {}
+
+		for (template, envs) in self.cache.items():
+			shards = previous.get(template)
+
+			if template not in self.__modified and shards is not None and shards.keys() == envs.keys() \
+				and all((data_path/shard).is_file() for shard, _ in shards.values()):
+				index[template] = shards
+				continue
+
+			index[template] = {}
+
+			for (data_env, data) in envs.items():
+				shard = f"{self.data_prefix}/{template}.{data_env}.json"
+				value = self.__serialize(template, data, encoder)
+
+				# Templates are often rendered again without their data changing.
+				write_if_changed(data_path/shard, value)
+				index[template][data_env] = [shard, len(value)]
+
+		# Shards of templates and data sections that no longer have data.
+		current = { shard for shards in index.values() for shard, _ in shards.values() }
+		for shards in previous.values():
+			for shard, _ in shards.values():
+				if shard not in current:
+					(data_path/shard).unlink(missing_ok=True)
+
+		write_if_changed(index_path, orjson.dumps(index, option=orjson.OPT_SORT_KEYS))
+
+	def __remove_shards(self, data_path):
+		(data_path/EMBEDDED_INDEX_FILE).unlink(missing_ok=True)
+
+		if (data_path/self.data_prefix).exists():
+			shutil.rmtree(data_path/self.data_prefix)
+
 
 class EmbeddedDataExtension(jinja2.ext.Extension):
 
@@ -384,15 +1052,22 @@ class EmbeddedDataSectionExtension(jinja2.ext.Extension):
 
 		return rv
 
+@dataclasses.dataclass
+class ModuleImports:
+	""" Styles and scripts a page imports through {% extern %} and {% insert %}, in the order they were first used. """
+	styles: dict = dataclasses.field(default_factory=dict)
+	scripts: dict = dataclasses.field(default_factory=dict)
+	# Whether the page printed imported_styles() or imported_scripts(), and so has markers to replace.
+	printed: bool = False
+
 class ExternalModuleExtension(jinja2.ext.Extension):
 
 	tags = {"extern", "insert"}
 
 	def __init__(self, environment: jinja2.Environment) -> None:
 		super().__init__(environment)
-		self.__scripts = set()
-		self.__styles = set()
-
+		# Imports of every template being rendered, None for renders outside of a project build.
+		self.__imports = {}
 
 	def parse(self, parser):
 		lineno = next(parser.stream).lineno
@@ -400,15 +1075,17 @@ class ExternalModuleExtension(jinja2.ext.Extension):
 		module_path = parser.parse_expression().value
 		split = module_path.split("/", 1)
 
+		# The tags for the style and script are created when rendering, since their urls depend upon the build.
 		if len(split) == 1:
+			module        = split[0]
 			template_path = f"@{module}/module.jinja"
-			style_path    = nodes.Const(utils.style(f"@{module}/module.css"))
-			script_path   = nodes.Const(utils.script(f"@{module}/module.js"))
+			style_path    = nodes.Const(f"@{module}/module.css")
+			script_path   = nodes.Const(f"@{module}/module.js")
 		else:
 			module, path  = split
 			template_path = f"@{module}/{path}.jinja"
-			style_path    = nodes.Const(utils.style(f"@{module}/{path}.css"))
-			script_path   = nodes.Const(utils.script(f"@{module}/{path}.js"))
+			style_path    = nodes.Const(f"@{module}/{path}.css")
+			script_path   = nodes.Const(f"@{module}/{path}.js")
 
 		match parser._tag_stack[-1]:
 			case "extern":
@@ -425,13 +1102,41 @@ class ExternalModuleExtension(jinja2.ext.Extension):
 
 		return [import_node, call_node]
 
+	def __template(self):
+		project = getattr(self.environment, "project", None)
+
+		try:
+			return None if project is None else project.current_template()
+		except IndexError:
+			return None
+
+	def begin(self, template):
+		""" Starts collecting the imports of a template, which is about to be rendered. """
+		self.__imports[template] = ModuleImports()
+
+	def finish(self, template):
+		""" The imports collected while rendering template. """
+		return self.__imports.pop(template, None) or ModuleImports()
+
+	def __print(self, marker, tag, paths):
+		template = self.__template()
+		imports = self.__imports.setdefault(template, ModuleImports())
+
+		# Outside of a build nothing replaces the marker, so the tags imported so far are printed instead.
+		if template is None:
+			return jinja2.filters.Markup("\n".join(tag(path) for path in paths(imports)))
+
+		imports.printed = True
+		return jinja2.filters.Markup(marker)
+
 	def print_scripts(self):
-		return "\n".join(self.__scripts)
+		return self.__print(bundles.SCRIPTS_MARKER, utils.script, lambda imports: imports.scripts)
 
 	def print_style(self):
-		return "\n".join(self.__styles)
+		return self.__print(bundles.STYLES_MARKER, utils.style, lambda imports: imports.styles)
 
 	def _render_html(self, style, script, caller=None):
-		self.__scripts.add(script)
-		self.__styles.add(style)
+		imports = self.__imports.setdefault(self.__template(), ModuleImports())
+		imports.scripts[script] = None
+		imports.styles[style] = None
 		return ""
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+In memory index of the files below a directory, built with a single os.scandir() walk. Template discovery, the
+iter_template() globs and the template filters all run against the index instead of walking the tree every time.
+"""
+
+import os
+import pathlib
+import re
+
+def translate(pattern):
+	"""
+	Translates a glob pattern to a regular expression matching relative posix paths. Like pathlib, * and ? do not
+	match across directories, and a ** segment matches any number of directories.
+	"""
+	segments = pattern.split("/")
+	regex = []
+
+	for i, segment in enumerate(segments):
+		if segment == "**":
+			regex.append("(?:[^/]+/)*")
+			continue
+
+		index = 0
+		while index < len(segment):
+			char = segment[index]
+			index += 1
+
+			if char == "*":
+				regex.append("[^/]*")
+			elif char == "?":
+				regex.append("[^/]")
+			elif char == "[" and "]" in segment[index + 1:]:
+				# A ] right after the opening bracket is part of the set.
+				end = segment.index("]", index + 1)
+				chars = segment[index:end].replace("\\", "\\\\")
+				index = end + 1
+
+				if chars.startswith("!"):
+					chars = "^" + chars[1:]
+				elif chars.startswith("^"):
+					chars = "\\" + chars
+
+				regex.append(f"[{chars}]")
+			else:
+				regex.append(re.escape(char))
+
+		if i < len(segments) - 1:
+			regex.append("/")
+
+	return re.compile("".join(regex) + r"\Z")
+
+class FileIndex:
+	""" Paths (relative, posix) and stat results of every file below root. Scanned on first use. """
+
+	def __init__(self, root):
+		# Absolute, so that absolute paths and paths relative to the working directory can be told apart in stat().
+		self.__root = pathlib.Path(root).absolute()
+		self.__files = None
+		self.__patterns = {}
+
+	@property
+	def root(self):
+		return self.__root
+
+	@property
+	def files(self):
+		if self.__files is None:
+			self.__files = dict(sorted(self.__scan(self.__root, "")))
+
+		return self.__files
+
+	def __scan(self, directory, prefix):
+		try:
+			entries = list(os.scandir(directory))
+		except FileNotFoundError:
+			return
+
+		for entry in entries:
+			name = prefix + entry.name
+
+			if entry.is_dir(follow_symlinks=False):
+				yield from self.__scan(entry.path, name + "/")
+			elif entry.is_file():
+				yield name, entry.stat()
+
+	def invalidate(self):
+		""" Drops the index, so that it is scanned again on next use. """
+		self.__files = None
+
+	def glob(self, pattern):
+		""" Files matching pattern at any depth, like pathlib.Path.rglob(). """
+		if pattern not in self.__patterns:
+			self.__patterns[pattern] = translate(f"**/{pattern}")
+
+		regex = self.__patterns[pattern]
+		return [name for name in self.files if regex.match(name)]
+
+	def stat(self, path):
+		"""
+		The indexed stat result of path (a name relative to root, or a path given as a pathlib.Path, which is
+		relative to the working directory unless absolute), or os.stat() of files outside of root.
+		"""
+		if isinstance(path, pathlib.PurePath):
+			path = pathlib.Path(path).absolute()
+
+			if not path.is_relative_to(self.__root):
+				return os.stat(path)
+
+			path = path.relative_to(self.__root)
+		else:
+			path = pathlib.PurePosixPath(path)
+
+		result = self.files.get(path.as_posix())
+		if result is None:
+			return os.stat(self.__root/path)
+
+		return result
+
+__all__ = [
+	"FileIndex",
+]
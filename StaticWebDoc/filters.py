@@ -9,9 +9,18 @@ class BaseFilter:
 	def project(self):
 		return self.__project
 
+	def stat(self, template):
+		""" Stat result of a template file, from the template index of the current build. """
+		return self.__project.template_index.stat(template)
+
 	def __call__(self, template, rendered):
 		raise NotImplementedError("")
 
 class LastModified(BaseFilter):
 	def __call__(self, template, rendered):
-		return not os.path.isfile(rendered) or os.path.getmtime(template) > os.path.getmtime(rendered)
\ No newline at end of file
+		try:
+			rendered = os.stat(rendered)
+		except FileNotFoundError:
+			return True
+
+		return self.stat(template).st_mtime > rendered.st_mtime
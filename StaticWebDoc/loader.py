@@ -8,7 +8,7 @@ class CustomLoader(jinja2.FileSystemLoader):
 	def __init__(self, searchpath, encoding="utf-8", followlinks=False):
 		super().__init__(searchpath, encoding=encoding, followlinks=followlinks)
 
-		self.__loader = modules.ModuleLoader()
+		self.__loader = modules.REGISTRY
 
 	def get_source(self, env, template: str):
 		if template.startswith("@"):
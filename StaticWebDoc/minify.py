@@ -0,0 +1,61 @@
+"""
+Streaming front end for htmlmin: the page can be fed in chunks, and the minified output is passed on after every
+chunk instead of being collected for the whole page. The output is the same as htmlmin.minify() of the whole page.
+"""
+
+import htmlmin.parser
+
+# htmlmin looks back at the last two pieces of output (to merge spaces, and to drop whitespace before a doctype),
+# so those are held back until the next chunk.
+HELD_BACK = 2
+
+class HTMLMinifier(htmlmin.parser.HTMLMinParser):
+	""" Call feed() with as many chunks as needed and close() at the end. Takes the options of htmlmin.minify(). """
+
+	def __init__(self, write, **options):
+		super().__init__(**options)
+		self.__write = write
+		self.__pending = []
+
+	def feed(self, data):
+		self.__pending.append(data)
+
+		# htmlmin treats every piece of text on its own (whitespace only pieces can be dropped), so text is only fed
+		# once the tag that ends it has started.
+		if "<" not in data:
+			return
+
+		pending = "".join(self.__pending)
+		index = pending.rfind("<")
+		self.__pending = [pending[index:]]
+
+		super().feed(pending[:index])
+		self.flush(HELD_BACK)
+
+	def close(self):
+		super().feed("".join(self.__pending))
+		self.__pending = []
+
+		super().close()
+		self.flush()
+
+	def flush(self, keep=0):
+		buffer = self._data_buffer
+		count = len(buffer) - keep
+
+		if count > 0:
+			self.__write("".join(buffer[:count]))
+			del buffer[:count]
+
+def minify(source, **options):
+	parts = []
+	minifier = HTMLMinifier(parts.append, **options)
+	minifier.feed(source)
+	minifier.close()
+
+	return "".join(parts)
+
+__all__ = [
+	"HTMLMinifier",
+	"minify",
+]
@@ -3,6 +3,9 @@ import pathlib
 import jinja2
 import importlib
 import inspect
+import threading
+
+import StaticWebDoc.fileindex as fileindex
 
 def map_dirs(root, dirs):
 	return list(map(
@@ -11,8 +14,41 @@ def map_dirs(root, dirs):
 	))
 
 class ModuleLoader:
+	"""
+	Resolves @module paths to the Module of the python package. Every module is only imported and instantiated once,
+	REGISTRY is shared by template loading, asset lookups and the test server.
+	"""
+
 	def __init__(self):
 		self.__modules = {}
+		self.__lock = threading.Lock()
+
+	def module(self, mname):
+		module = self.__modules.get(mname)
+
+		if module is None:
+			# The test server resolves modules from several threads.
+			with self.__lock:
+				if mname not in self.__modules:
+					self.__modules[mname] = self.__instantiate(mname)
+
+				module = self.__modules[mname]
+
+		return module
+
+	def __instantiate(self, mname):
+		module = importlib.import_module(mname)
+
+		if "__init__.py" not in module.__file__:
+			raise ValueError(f"Invalid module requested for SWD: {module.__file__}")
+
+		for key in dir(module):
+			obj = getattr(module, key)
+			if inspect.isclass(obj):
+				if issubclass(obj, Module) and obj != Module:
+					return obj()
+
+		raise ValueError(f"No SWD module declared in {mname}")
 
 	def load_module(self, path):
 		if path.startswith("@"):
@@ -20,24 +56,15 @@ class ModuleLoader:
 			mname = path[1: index]
 			nested_template = path[index + 1:]
 
-			if mname in self.__modules:
-				return self.__modules[mname], mname, nested_template
-
-			module = importlib.import_module(mname)
-
-			if "__init__.py" not in module.__file__:
-				raise ValueError(f"Invalid module requested for SWD: {module.__file__}")
-
-			for key in dir(module):
-				obj = getattr(module, key)
-				if inspect.isclass(obj):
-					if issubclass(obj, Module) and obj != Module:
-						mod = obj()
-						self.__modules[mname] = mod
-						return (mod, mname, nested_template)
+			return self.module(mname), mname, nested_template
 		else:
 			raise ValueError(f"Could not load SWD module {path}")
 
+	def file_path(self, path):
+		""" Returns the file an @module/... path is served from. """
+		module, _, nested = self.load_module(path)
+		return module.get_file_path(nested)
+
 class Module:
 	templates = []
 	scripts = []
@@ -54,15 +81,44 @@ class Module:
 		self.__style = map_dirs(self.__mod_dir, self.__style)
 
 		self.__loader = jinja2.FileSystemLoader(self.__templates)
+		self.__files = None
 
 	@property
 	def loader(self):
 		return self.__loader
 
+	@property
+	def files(self):
+		"""
+		Maps the path (relative to the module directory) of every template, script and style to its file. Scanned
+		once, on first use.
+		"""
+		if self.__files is None:
+			files = {}
+
+			for directory in self.__templates + self.__scripts + self.__style:
+				prefix = pathlib.Path(directory).relative_to(self.__mod_dir).as_posix()
+
+				for name in fileindex.FileIndex(directory).files:
+					files[f"{prefix}/{name}"] = f"{directory}/{name}"
+
+			self.__files = files
+
+		return self.__files
+
 	def get_file_path(self, path):
-		return f"{self.__mod_dir}/{path}"
+		# Files added after the module was indexed are still found, they are just not looked up in the index.
+		file = self.files.get(path)
+		if file is None:
+			return f"{self.__mod_dir}/{path}"
+
+		return file
+
+# Process wide module registry.
+REGISTRY = ModuleLoader()
 
 __all__ = [
 	"Module",
 	"ModuleLoader",
+	"REGISTRY",
 ]
\ No newline at end of file
@@ -0,0 +1,308 @@
+"""
+Packaging: synchronizes the build directory with the rendered output and the static asset directories. Only new or
+changed files are copied (or linked), and files that no longer have a source are removed, so packaging an unchanged
+project touches nothing.
+"""
+
+import concurrent.futures
+import dataclasses
+import gzip
+import os
+import pathlib
+import shutil
+
+from StaticWebDoc.dependencies import file_digest
+
+COPY = "copy"
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+LINK_MODES = (COPY, HARDLINK, REFLINK)
+
+# ioctl request of Linux to clone a file (btrfs, xfs and other copy on write filesystems).
+FICLONE = 0x40049409
+
+def gzip_compress(data, level):
+	# A fixed mtime keeps the output the same for the same input.
+	return gzip.compress(data, compresslevel=level, mtime=0)
+
+def brotli_compress(data, level):
+	try:
+		import brotli
+	except ImportError:
+		raise ImportError("Compressing with br needs the brotli package (pip install brotli).")
+
+	return brotli.compress(data, quality=level)
+
+# Compression algorithms by Content-Encoding name: (suffix of the sibling, compress function, default level).
+COMPRESSORS = {
+	"gzip": (".gz", gzip_compress, 9),
+	"br": (".br", brotli_compress, 11),
+}
+
+@dataclasses.dataclass
+class Compression:
+	""" Settings of the precompression stage of package(). """
+	algorithms: tuple = ("gzip",)
+	# Level of each algorithm, algorithms without one use the highest level.
+	levels: dict = dataclasses.field(default_factory=dict)
+	# Files smaller than this (in bytes) are not worth compressing.
+	min_size: int = 1024
+	extensions: tuple = (".html", ".json", ".css", ".js", ".mjs", ".svg", ".xml", ".txt")
+	jobs: int | None = None
+	# zlib and brotli release the GIL while compressing, so threads are usually enough.
+	processes: bool = False
+
+	def __post_init__(self):
+		for algorithm in self.algorithms:
+			if algorithm not in COMPRESSORS:
+				raise ValueError(f"Unknown compression: {algorithm}, expected one of {', '.join(COMPRESSORS)}")
+
+	@property
+	def suffixes(self):
+		return tuple(COMPRESSORS[a][0] for a in self.algorithms)
+
+@dataclasses.dataclass
+class CompressionReport:
+	compressed: int = 0
+	unchanged: int = 0
+	removed: int = 0
+	bytes_in: int = 0
+	bytes_out: int = 0
+
+	def summary(self):
+		mb = 1024 * 1024
+		return (
+			f"{self.compressed} compressed ({self.bytes_in / mb:.1f} MB to {self.bytes_out / mb:.1f} MB), "
+			f"{self.unchanged} unchanged, {self.removed} removed")
+
+@dataclasses.dataclass
+class SyncReport:
+	copied: int = 0
+	linked: int = 0
+	unchanged: int = 0
+	removed: int = 0
+	bytes_copied: int = 0
+	bytes_linked: int = 0
+	bytes_removed: int = 0
+
+	def summary(self):
+		mb = 1024 * 1024
+		return (
+			f"{self.copied} copied ({self.bytes_copied / mb:.1f} MB), {self.linked} linked "
+			f"({self.bytes_linked / mb:.1f} MB), {self.unchanged} unchanged, {self.removed} removed "
+			f"({self.bytes_removed / mb:.1f} MB)")
+
+def scan_files(root):
+	""" Maps the path of every file below root, relative to root, to its stat result. """
+	files = {}
+	directories = [pathlib.Path(root)]
+
+	while len(directories) > 0:
+		directory = directories.pop()
+
+		try:
+			entries = os.scandir(directory)
+		except (FileNotFoundError, NotADirectoryError):
+			continue
+
+		with entries:
+			for entry in entries:
+				if entry.is_dir():
+					directories.append(directory/entry.name)
+				elif entry.is_file():
+					files[(directory/entry.name).relative_to(root)] = entry.stat()
+
+	return files
+
+def is_unchanged(source, source_stat, target, target_stat, checksum):
+	if source_stat.st_size != target_stat.st_size:
+		return False
+
+	# Hardlinks of the source, and copies made by an earlier sync (which keep the mtime), are unchanged.
+	if (source_stat.st_dev, source_stat.st_ino) == (target_stat.st_dev, target_stat.st_ino):
+		return True
+	if source_stat.st_mtime_ns == target_stat.st_mtime_ns:
+		return True
+
+	if checksum and file_digest(source) == file_digest(target):
+		shutil.copystat(source, target)
+		return True
+
+	return False
+
+def reflink(source, target):
+	import fcntl
+
+	with open(source, "rb") as src, open(target, "wb") as dst:
+		fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+	shutil.copystat(source, target)
+
+def transfer(source, target, mode):
+	""" Copies or links source to target, and returns whether or not it was linked. """
+	if mode == HARDLINK:
+		try:
+			os.link(source, target)
+			return True
+		except OSError:
+			pass
+	elif mode == REFLINK:
+		try:
+			reflink(source, target)
+			return True
+		except (OSError, ImportError):
+			pass
+
+	# Linking is not supported across filesystems (or at all on some), so fall back to a copy.
+	shutil.copy2(source, target)
+	return False
+
+def sync(sources, target, mode=COPY, checksum=False, files=None, siblings=()):
+	"""
+	Makes target contain exactly the files of sources, a list of (source directory, directory relative to target)
+	pairs, and of files, which maps paths relative to target to single source files. Files of later sources replace
+	files of earlier ones at the same path. A file is unchanged when its size and modification time match, or with
+	checksum when its content matches. Files named like a synchronized file plus one of the siblings suffixes (the
+	precompressed files) are kept.
+
+	Hardlinked files share their content with the source, so they must never be modified inside of target. The
+	renderer replaces its output files instead of writing them in place, so a render after packaging leaves the
+	files of target as they were packaged.
+	"""
+	if mode not in LINK_MODES:
+		raise ValueError(f"Unknown link mode: {mode}, expected one of {', '.join(LINK_MODES)}")
+
+	target = pathlib.Path(target)
+	report = SyncReport()
+	planned = {}
+
+	for source, prefix in sources:
+		source = pathlib.Path(source)
+		for path, info in scan_files(source).items():
+			planned[prefix/path] = (source/path, info)
+
+	for path, source in (files or {}).items():
+		planned[pathlib.Path(path)] = (pathlib.Path(source), os.stat(source))
+
+	existing = scan_files(target)
+
+	for path, info in existing.items():
+		if path.suffix in siblings and path.with_suffix("") in planned:
+			continue
+
+		if path not in planned:
+			(target/path).unlink()
+			report.removed += 1
+			report.bytes_removed += info.st_size
+
+	for path, (source, info) in planned.items():
+		destination = target/path
+		current = existing.get(path)
+
+		if current is not None:
+			if is_unchanged(source, info, destination, current, checksum):
+				report.unchanged += 1
+				continue
+
+			# Unlink first, so the content of a hardlinked source is never overwritten.
+			destination.unlink()
+		elif destination.is_dir():
+			shutil.rmtree(destination)
+
+		destination.parent.mkdir(exist_ok=True, parents=True)
+
+		if transfer(source, destination, mode):
+			report.linked += 1
+			report.bytes_linked += info.st_size
+		else:
+			report.copied += 1
+			report.bytes_copied += info.st_size
+
+	remove_empty_dirs(target)
+
+	return report
+
+def compress_file(path, algorithms, levels):
+	"""
+	Writes the compressed siblings of a file. Every sibling gets the modification time of the file, which tells
+	later runs (and the test server) that it is up to date.
+	"""
+	info = os.stat(path)
+	data = None
+	written = 0
+
+	for algorithm in algorithms:
+		suffix, compress_fn, default_level = COMPRESSORS[algorithm]
+		sibling = path + suffix
+
+		try:
+			if os.stat(sibling).st_mtime_ns == info.st_mtime_ns:
+				continue
+		except FileNotFoundError:
+			pass
+
+		if data is None:
+			with open(path, "rb") as f:
+				data = f.read()
+
+		compressed = compress_fn(data, levels.get(algorithm, default_level))
+		temporary = f"{sibling}.{os.getpid()}.tmp"
+
+		with open(temporary, "wb") as f:
+			f.write(compressed)
+
+		os.utime(temporary, ns=(info.st_atime_ns, info.st_mtime_ns))
+		os.replace(temporary, sibling)
+		written += len(compressed)
+
+	return info.st_size if data is not None else 0, written
+
+def compress(root, compression):
+	"""
+	Writes compressed siblings of every text file below root that is large enough, in parallel. Removes the siblings
+	of files which are not compressed any more (they shrank below min_size), which would be served stale otherwise.
+	"""
+	report = CompressionReport()
+	files = scan_files(root)
+	selected = {
+		path for path, info in files.items()
+		if path.suffix in compression.extensions and info.st_size >= compression.min_size}
+	paths = [str(pathlib.Path(root)/path) for path in files if path in selected]
+
+	for path in files:
+		if path.suffix in compression.suffixes and path.with_suffix("") in files and path.with_suffix("") not in selected:
+			(pathlib.Path(root)/path).unlink()
+			report.removed += 1
+
+	executor = concurrent.futures.ProcessPoolExecutor if compression.processes else concurrent.futures.ThreadPoolExecutor
+
+	with executor(compression.jobs) as pool:
+		results = pool.map(
+			compress_file, paths,
+			[compression.algorithms] * len(paths), [compression.levels] * len(paths),
+			chunksize=64 if compression.processes else 1)
+
+		for bytes_in, bytes_out in results:
+			if bytes_out > 0:
+				report.compressed += 1
+				report.bytes_in += bytes_in
+				report.bytes_out += bytes_out
+			else:
+				report.unchanged += 1
+
+	return report
+
+def remove_empty_dirs(root):
+	# Bottom up, so directories which only held empty directories are removed as well.
+	for directory, _, _ in os.walk(root, topdown=False):
+		if directory != str(root) and len(os.listdir(directory)) == 0:
+			os.rmdir(directory)
+
+__all__ = [
+	"Compression",
+	"CompressionReport",
+	"SyncReport",
+	"compress",
+	"sync",
+	"LINK_MODES",
+]
@@ -0,0 +1,118 @@
+"""
+Post-processing of rendered pages off of the render thread: a pool of worker processes beautifies or minifies pages
+and writes them, while the render thread goes on with the next template. Rendering is the only step that needs the
+state of the project, and processes (rather than threads) let formatting, which is pure python, run alongside it.
+"""
+
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+
+import StaticWebDoc.beautify as beautify
+import StaticWebDoc.bundles as bundles
+import StaticWebDoc.minify as minify
+
+from StaticWebDoc.exceptions import RenderError
+
+# Pages waiting for a worker, per worker, unless given.
+PENDING_PER_WORKER = 2
+# Bytes compared at a time by same_content().
+CHUNK_SIZE = 1 << 16
+
+def same_content(a, b, chunk_size=CHUNK_SIZE):
+	""" Whether the files a and b have the same content, read a chunk at a time. False when either does not exist. """
+	try:
+		if a.stat().st_size != b.stat().st_size:
+			return False
+	except FileNotFoundError:
+		return False
+
+	with open(a, 'rb') as fa, open(b, 'rb') as fb:
+		while True:
+			chunk = fa.read(chunk_size)
+			if chunk != fb.read(chunk_size):
+				return False
+			elif chunk == b"":
+				return True
+
+def replace_page(temporary, path, source):
+	"""
+	Moves the completely written temporary file of a page into place. A page that renders the same as before keeps
+	its file (and so its mtime and inode), unless its template source is newer: the LastModified filter would then
+	select it again on every build.
+	"""
+	if same_content(temporary, path):
+		stat = path.stat()
+
+		if stat.st_mtime >= source.stat().st_mtime:
+			temporary.unlink()
+		elif stat.st_nlink > 1:
+			# Touching it would touch the file of a package which hardlinks it as well, see packaging.sync().
+			os.replace(temporary, path)
+		else:
+			temporary.unlink()
+			os.utime(path)
+	else:
+		os.replace(temporary, path)
+
+def write_page(path, source, page, beautify_page, links):
+	""" Formats page, replaces the import markers with their links and writes it to path. Runs in the workers. """
+	page = beautify.beautify(page) if beautify_page else minify.minify(page, remove_empty_space=True)
+
+	if len(links) > 0:
+		page = bundles.link_markers(page, links)
+
+	path.parent.mkdir(exist_ok=True, parents=True)
+	temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+	try:
+		with open(temporary, 'w') as output:
+			output.write(page)
+
+		replace_page(temporary, path, source)
+	except BaseException:
+		temporary.unlink(missing_ok=True)
+		raise
+
+class PagePipeline:
+	"""
+	Worker processes that post-process and write pages. submit() returns as soon as the page is queued; once
+	max_pending pages wait for a worker it blocks until one of them is done, which bounds the memory held by pages
+	in flight. Needs the fork start method.
+	"""
+
+	def __init__(self, workers, max_pending=None):
+		self.__pool = concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+		self.__slots = threading.BoundedSemaphore(max_pending or workers * PENDING_PER_WORKER)
+		self.__pending = []
+
+	def submit(self, template, fn, *args):
+		self.__slots.acquire()
+
+		try:
+			future = self.__pool.submit(fn, *args)
+		except BaseException:
+			self.__slots.release()
+			raise
+
+		future.add_done_callback(lambda _: self.__slots.release())
+		self.__pending.append((template, future))
+
+	def drain(self):
+		""" Waits for every submitted page, and raises the error of the first one that failed as a RenderError. """
+		pending, self.__pending = self.__pending, []
+
+		for template, future in pending:
+			ex = future.exception()
+			if ex is not None:
+				raise RenderError(template, ex)
+
+	def close(self):
+		self.__pool.shutdown(cancel_futures=True)
+
+__all__ = [
+	"PagePipeline",
+	"replace_page",
+	"write_page",
+]
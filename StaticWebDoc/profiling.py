@@ -0,0 +1,155 @@
+"""
+Build profiling: records how long every template and every phase of a build takes. The result is written in the
+Chrome trace event format, which chrome://tracing, Perfetto and speedscope can open as a flame graph.
+"""
+
+import contextlib
+import dataclasses
+import os
+import threading
+import time
+
+import orjson
+
+# Phase recorded around everything a template render does, including the renders get_field pulls in.
+TEMPLATE_PHASE = "template"
+SUMMARY_SIZE = 10
+
+@dataclasses.dataclass
+class Span:
+	name: str
+	template: str | None
+	start: int
+	# Time spent in nested phases, and in nested template renders only.
+	children: int = 0
+	nested: int = 0
+	# Phases which run interleaved inside of this one (e.g. post processing a page while it is being generated),
+	# and so can only be measured as the sum of many short intervals.
+	interleaved: dict = dataclasses.field(default_factory=dict)
+
+	def account(self, name, duration):
+		self.interleaved[name] = self.interleaved.get(name, 0) + duration
+
+class Profiler:
+	"""
+	Records nested phases of a build. Every phase knows its self time (without nested phases), and every template
+	render knows its exclusive time (without the renders of other templates it triggered through get_field).
+	"""
+
+	def __init__(self):
+		self.__events = []
+		self.__stack = []
+
+	@property
+	def events(self):
+		return self.__events
+
+	@contextlib.contextmanager
+	def phase(self, name, template=None):
+		span = Span(name, template, time.perf_counter_ns())
+		self.__stack.append(span)
+
+		try:
+			yield span
+		finally:
+			self.__stack.pop()
+			self.__record(span, time.perf_counter_ns() - span.start)
+
+	def __record(self, span, duration):
+		if len(self.__stack) > 0:
+			self.__stack[-1].children += duration
+
+		if span.name == TEMPLATE_PHASE:
+			for parent in reversed(self.__stack):
+				if parent.name == TEMPLATE_PHASE:
+					parent.nested += duration
+					break
+
+		interleaved = sum(span.interleaved.values())
+		args = { "self_us": (duration - span.children - interleaved) / 1000 }
+
+		for name, total in span.interleaved.items():
+			args[f"{name}_us"] = total / 1000
+
+		if len(span.interleaved) > 0:
+			args["interleaved"] = sorted(span.interleaved)
+		if span.template is not None:
+			args["template"] = span.template
+		if span.name == TEMPLATE_PHASE:
+			args["exclusive_us"] = (duration - span.nested) / 1000
+
+		self.__events.append({
+			"name": span.template if span.name == TEMPLATE_PHASE else span.name,
+			"cat": span.name,
+			"ph": "X",
+			"ts": span.start / 1000,
+			"dur": duration / 1000,
+			"pid": os.getpid(),
+			"tid": threading.get_native_id(),
+			"args": args
+		})
+
+	def merge(self, events):
+		""" Adds the events recorded by a render worker. """
+		self.__events.extend(events)
+
+	def write(self, path):
+		main = os.getpid()
+		processes = sorted({ e["pid"] for e in self.__events } | {main})
+		metadata = [
+			{ "name": "process_name", "ph": "M", "pid": pid, "args": { "name": "build" if pid == main else "render worker" } }
+			for pid in processes]
+
+		with open(path, "wb") as f:
+			f.write(orjson.dumps({ "traceEvents": metadata + self.__events, "displayTimeUnit": "ms" }))
+
+	def report(self, logger, top=SUMMARY_SIZE):
+		""" Logs the slowest templates and the time spent in every phase. """
+		templates = sorted(
+			(e for e in self.__events if e["cat"] == TEMPLATE_PHASE), key=lambda e: e["dur"], reverse=True)
+
+		phases = {}
+		for event in self.__events:
+			args = event["args"]
+			for name, self_time in [(event["cat"], args["self_us"])] + [(n, args[f"{n}_us"]) for n in args.get("interleaved", [])]:
+				count, total = phases.get(name, (0, 0))
+				phases[name] = (count + 1, total + self_time)
+
+		logger.normal(f"[Profile] {len(templates)} template renders", "green")
+
+		if len(templates) > 0:
+			logger.normal(f"{'inclusive':>12} {'exclusive':>12}  slowest templates")
+			for event in templates[:top]:
+				logger.normal(f"{event['dur'] / 1000:>10.2f}ms {event['args']['exclusive_us'] / 1000:>10.2f}ms  {event['name']}")
+
+		logger.normal(f"{'self time':>12} {'count':>8}  phase")
+		for name, (count, total) in sorted(phases.items(), key=lambda p: p[1][1], reverse=True):
+			logger.normal(f"{total / 1000:>10.2f}ms {count:>8}  {name}")
+
+def timed(span, name, fn):
+	""" Wraps fn so that its calls are accounted to span as the interleaved phase name (when profiling). """
+	if span is None:
+		return fn
+
+	def inner(*args, **kwds):
+		start = time.perf_counter_ns()
+
+		try:
+			return fn(*args, **kwds)
+		finally:
+			span.account(name, time.perf_counter_ns() - start)
+
+	return inner
+
+def phase(profiler, name, template=None):
+	""" Records a phase when profiling, and does nothing otherwise. """
+	if profiler is None:
+		return contextlib.nullcontext()
+
+	return profiler.phase(name, template)
+
+__all__ = [
+	"Profiler",
+	"phase",
+	"timed",
+]
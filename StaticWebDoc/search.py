@@ -0,0 +1,208 @@
+"""
+Full text search index, built while pages are rendered: the text of every page is tokenized as it is streamed into
+its output, and the fields of the page are added with a higher weight. Pages that are not rendered again keep
+their terms from the previous build, so a build only tokenizes what it renders.
+
+The index is written to data/search/:
+
+	index.json          { "version": 1, "prefix": PREFIX_SIZE, "shards": [<key>, ...] }
+	documents.json      [{ "url": ..., "title": ... } or null, ...], a document id is its position
+	shards/<key>.json   { <term>: [[<document id>, <weight>], ...] }, postings ordered by document id
+
+Terms are lower case words. The shard of a term is its first PREFIX_SIZE characters, or "_" followed by the hex
+of their UTF-8 bytes when those are not all ascii letters and digits, so a client only downloads the shards of
+the terms it looks up. Document ids stay the same between builds, which keeps the shards of unchanged terms (and
+so their files) the same.
+"""
+
+import collections
+import html.parser
+import re
+
+import orjson
+
+import StaticWebDoc.extensions as extensions
+
+INDEX_FILE = "index.json"
+DOCUMENTS_FILE = "documents.json"
+SHARD_DIR = "shards"
+INDEX_VERSION = 1
+PREFIX_SIZE = 2
+MAX_TERM_SIZE = 32
+# Occurrences of a term in a field (e.g. the name or summary of a page) count this many times.
+FIELD_WEIGHT = 5
+# Elements whose content is not text of the page.
+SKIPPED_ELEMENTS = {"script", "style", "template"}
+
+TERM = re.compile(r"\w{2,}")
+
+def terms(text):
+	return [term for term in TERM.findall(text.lower()) if len(term) <= MAX_TERM_SIZE]
+
+def shard_key(term):
+	key = term[:PREFIX_SIZE]
+	if key.isascii() and key.isalnum():
+		return key
+
+	return "_" + key.encode("utf-8").hex()
+
+class TextExtractor(html.parser.HTMLParser):
+	""" Counts the terms in the text of a page, which can be fed in chunks. Also picks up its title. """
+
+	def __init__(self):
+		super().__init__()
+		self.__terms = collections.Counter()
+		self.__title = []
+		self.__skipped = None
+		self.__in_title = False
+
+	@property
+	def terms(self):
+		return self.__terms
+
+	@property
+	def title(self):
+		return " ".join("".join(self.__title).split())
+
+	def handle_starttag(self, tag, attrs):
+		if tag in SKIPPED_ELEMENTS:
+			self.__skipped = tag
+		elif tag == "title":
+			self.__in_title = True
+
+	def handle_endtag(self, tag):
+		if tag == self.__skipped:
+			self.__skipped = None
+		elif tag == "title":
+			self.__in_title = False
+
+	def handle_data(self, data):
+		if self.__skipped is not None:
+			return
+
+		if self.__in_title:
+			self.__title.append(data)
+
+		self.__terms.update(terms(data))
+
+def text_terms(source):
+	""" The terms of an html fragment. """
+	extractor = TextExtractor()
+	extractor.feed(source)
+	extractor.close()
+
+	return extractor.terms
+
+class SearchIndex(extensions.SimpleCache):
+	""" The terms of every rendered page, by template. Written out as an inverted index, see the module docs. """
+
+	def __init__(self, env):
+		super().__init__(env)
+		self.__changed = True
+		# Ids of the documents written last, by url.
+		self.__documents = None
+
+	@property
+	def data_prefix(self):
+		return "search"
+
+	def __setitem__(self, template, data):
+		super().__setitem__(template, data)
+		self.__changed = True
+
+	def discard(self, stale):
+		if any(template in self.cache for template in stale):
+			self.__changed = True
+
+		super().discard(stale)
+
+	def merge(self, entries):
+		super().merge(entries)
+		self.__changed = True
+
+	def add(self, template, url, extractor):
+		""" Adds the page of template, from the extractor its output was fed to. """
+		weights = collections.Counter(extractor.terms)
+		fields = self.env.fragment_cache.cache.get(template, {})
+
+		for value in fields.values():
+			for term, count in text_terms(str(value)).items():
+				weights[term] += count * FIELD_WEIGHT
+
+		title = " ".join(str(fields["name"]).split()) if "name" in fields else extractor.title
+
+		self[template, "url"] = url
+		self[template, "title"] = title
+		self[template, "terms"] = dict(weights)
+
+	def write(self, data_path):
+		""" Writes the index, only touching the files whose content changed. Does nothing when no page changed. """
+		data_path = data_path/self.data_prefix
+
+		if not self.__changed and (data_path/INDEX_FILE).exists():
+			return
+
+		documents = self.__assign_ids(data_path)
+		entries = sorted((documents[entry["url"]], entry) for entry in self.cache.values())
+		shards = {}
+
+		for document, entry in entries:
+			for term, weight in entry["terms"].items():
+				shards.setdefault(shard_key(term), {}).setdefault(term, []).append([document, weight])
+
+		shard_path = data_path/SHARD_DIR
+		shard_path.mkdir(parents=True, exist_ok=True)
+
+		for key, postings in shards.items():
+			extensions.write_if_changed(shard_path/f"{key}.json", orjson.dumps(postings, option=orjson.OPT_SORT_KEYS))
+
+		for path in shard_path.glob("*.json"):
+			if path.stem not in shards:
+				path.unlink()
+
+		listing = [None] * (max(documents.values(), default=-1) + 1)
+		for document, entry in entries:
+			listing[document] = { "url": entry["url"], "title": entry["title"] }
+
+		extensions.write_if_changed(data_path/DOCUMENTS_FILE, orjson.dumps(listing))
+		extensions.write_if_changed(data_path/INDEX_FILE, orjson.dumps(
+			{ "version": INDEX_VERSION, "prefix": PREFIX_SIZE, "shards": sorted(shards) }))
+
+		self.__changed = False
+
+	def __assign_ids(self, data_path):
+		"""
+		Keeps the ids of the documents written last and appends new ones. The ids are only compacted once more
+		than half of them belong to pages that no longer exist.
+		"""
+		if self.__documents is None:
+			self.__documents = self.__read_documents(data_path/DOCUMENTS_FILE)
+
+		urls = { entry["url"] for entry in self.cache.values() }
+		documents = { url: document for url, document in self.__documents.items() if url in urls }
+		next_id = max(self.__documents.values(), default=-1) + 1
+
+		if next_id > 2 * len(urls):
+			documents = {}
+			next_id = 0
+
+		for url in sorted(urls - set(documents)):
+			documents[url] = next_id
+			next_id += 1
+
+		self.__documents = documents
+		return documents
+
+	def __read_documents(self, path):
+		try:
+			with open(path, 'rb') as f:
+				listing = orjson.loads(f.read())
+		except (FileNotFoundError, orjson.JSONDecodeError):
+			return {}
+
+		return { entry["url"]: document for document, entry in enumerate(listing) if entry is not None }
+
+__all__ = [
+	"SearchIndex",
+	"TextExtractor",
+]
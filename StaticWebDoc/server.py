@@ -6,23 +6,342 @@ fully packaged to be able to correctly route requests.
 import pathlib
 import http.server as serv
 import contextlib
+import email.utils
+import hashlib
+import os
 import socket
+import threading
+import urllib.parse
 
+import jinja2
+
+import StaticWebDoc
+import StaticWebDoc.assets as assets
+import StaticWebDoc.bundles as bundles
+import StaticWebDoc.exceptions as exceptions
 import StaticWebDoc.modules as modules
 
 # Needed here, because the router construct seems to delete the variable reference.
-LOADER = modules.ModuleLoader()
+LOADER = modules.REGISTRY
 REROUTE_PATH = pathlib.Path("/render")
+MANIFEST_PATH = pathlib.Path("render")/"assets.json"
+RELOAD_PATH = "/__swd__/reload"
+RELOAD_SCRIPT = f'<script>new EventSource("{RELOAD_PATH}").onmessage = () => location.reload();</script>'
+KEEPALIVE_INTERVAL = 15
+# Precompressed siblings (file.html.br, file.html.gz) in order of preference, by Content-Encoding.
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+HASH_CHUNK_SIZE = 1 << 20
+
+def accepted_encodings(header):
+	""" Returns the encodings of an Accept-Encoding header, without those the client refuses with q=0. """
+	accepted = set()
+
+	for token in header.split(","):
+		name, *params = token.split(";")
+		quality = 1.0
+
+		for param in params:
+			key, _, value = param.strip().partition("=")
+			if key == "q":
+				try:
+					quality = float(value)
+				except ValueError:
+					quality = 0.0
+
+		if quality > 0 and len(name.strip()) > 0:
+			accepted.add(name.strip().lower())
+
+	return accepted
+
+class ReloadNotifier:
+	""" Lets every open page know when the project has been rebuilt in watch mode. """
+
+	def __init__(self):
+		self.__condition = threading.Condition()
+		self.__version = 0
+
+	@property
+	def version(self):
+		return self.__version
+
+	def notify(self):
+		with self.__condition:
+			self.__version += 1
+			self.__condition.notify_all()
+
+	def wait(self, version, timeout=None):
+		with self.__condition:
+			self.__condition.wait_for(lambda: self.__version != version, timeout)
+			return self.__version
 
 class SWD_Router(serv.SimpleHTTPRequestHandler):
+	# Cache-Control of every class of paths, by the first matching prefix.
+	cache_policies = [
+		("/document/", "no-cache"),
+		("/data/", "no-cache"),
+		("/@", "public, max-age=3600"),
+	]
+	default_cache_policy = "public, max-age=300"
+	# Fingerprinted assets change their name whenever their content changes.
+	immutable_cache_policy = "public, max-age=31536000, immutable"
+
 	def __init__(self, *args, directory=None, **kwargs):
 		super().__init__(*args, directory=directory, **kwargs)
 
+	@property
+	def notifier(self):
+		return getattr(self.server, "notifier", None)
+
+	@property
+	def project(self):
+		return getattr(self.server, "project", None)
+
+	def do_GET(self):
+		self.__serve(send_body=True)
+
+	def do_HEAD(self):
+		self.__serve(send_body=False)
+
+	def __serve(self, send_body):
+		""" Routes GET and HEAD requests alike, so HEAD reports the headers of the page GET would serve. """
+		path = self.path.split("?", 1)[0]
+
+		if self.project is not None and path.startswith("/document/") and path.endswith(StaticWebDoc.OUTPUT_EXTENSION):
+			return self.__send_rendered(urllib.parse.unquote(path), send_body)
+
+		if self.notifier is not None:
+			if path == RELOAD_PATH and send_body:
+				return self.__send_events()
+			elif path.endswith(".html"):
+				return self.__send_page(send_body)
+
+		return super().do_GET() if send_body else super().do_HEAD()
+
+	def __send_events(self):
+		self.send_response(200)
+		self.send_header("Content-Type", "text/event-stream")
+		self.send_header("Cache-Control", "no-cache")
+		self.end_headers()
+
+		version = self.notifier.version
+
+		try:
+			while True:
+				current = self.notifier.wait(version, KEEPALIVE_INTERVAL)
+
+				if current != version:
+					version = current
+					self.wfile.write(b"data: reload\n\n")
+				else:
+					self.wfile.write(b": keepalive\n\n")
+
+				self.wfile.flush()
+		except (BrokenPipeError, ConnectionResetError):
+			pass
+
+	def __send_page(self, send_body):
+		""" Serves a page with the reload script injected, so it refreshes after a rebuild. """
+		path = self.translate_path(self.path)
+
+		try:
+			with open(path, "rb") as f:
+				content = f.read()
+		except OSError:
+			return super().do_GET() if send_body else super().do_HEAD()
+
+		self.__send_html(content, send_body)
+
+	def __send_rendered(self, path, send_body):
+		""" Renders the page on demand instead of serving it from the render directory. """
+		name = pathlib.PurePosixPath(path).relative_to("/document").with_suffix(StaticWebDoc.TEMPLATE_EXTENSION)
+		template = name.as_posix()
+
+		if ".." in name.parts or not (self.project.template_dir/template).is_file():
+			return self.send_error(404, f"No template for {path}")
+
+		try:
+			content = self.project.render_page(template)
+		except jinja2.exceptions.TemplateError as ex:
+			return self.send_error(500, f"Failed to render {template}", exceptions.get_jinja_message(ex))
+		except exceptions.RenderError as ex:
+			return self.send_error(500, f"Failed to render {template}", ex.message)
+		except Exception as ex:
+			return self.send_error(500, f"Failed to render {template}", f"{type(ex).__name__}: {ex}")
+
+		self.__send_html(content.encode("utf-8"), send_body)
+
+	def __send_html(self, content, send_body):
+		"""
+		Serves a page that is not a file as it is (rendered on demand, or with the reload script injected while a
+		notifier is set), with the ETag of the bytes served, so conditional requests are still answered with 304.
+		"""
+		if self.notifier is not None:
+			script = RELOAD_SCRIPT.encode("utf-8")
+			index = content.rfind(b"</body>")
+			content = content + script if index == -1 else content[:index] + script + content[index:]
+
+		etag = f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+
+		if self.__etag_matches(etag):
+			self.send_response(304)
+			self.send_header("ETag", etag)
+			self.send_header("Cache-Control", "no-cache")
+			self.end_headers()
+			return
+
+		self.send_response(200)
+		self.send_header("Content-Type", "text/html; charset=utf-8")
+		self.send_header("Content-Length", str(len(content)))
+		self.send_header("ETag", etag)
+		self.send_header("Cache-Control", "no-cache")
+		self.end_headers()
+
+		if send_body:
+			self.wfile.write(content)
+
+	def __asset_path(self, path):
+		""" Maps a fingerprinted asset name back to the asset, when the project was built with fingerprints. """
+		manifest = pathlib.Path(self.directory)/MANIFEST_PATH
+
+		try:
+			mtime = manifest.stat().st_mtime_ns
+		except FileNotFoundError:
+			return path
+
+		if self.server.manifest is None or self.server.manifest[0] != mtime:
+			self.server.manifest = (mtime, assets.read_manifest(manifest))
+
+		return self.server.manifest[1].get(path.split("?", 1)[0], path)
+
+	def cache_policy(self, path):
+		if self.__asset_path(path) != path.split("?", 1)[0]:
+			return self.immutable_cache_policy
+
+		# Bundles are named by their content as well.
+		if path.startswith(f"/{StaticWebDoc.DATA_DIR}/{bundles.BUNDLE_DIR}/"):
+			return self.immutable_cache_policy
+
+		for prefix, policy in self.cache_policies:
+			if path.startswith(prefix):
+				return policy
+
+		return self.default_cache_policy
+
+	def send_head(self):
+		"""
+		Serves files with a strong ETag (a hash of the content), answers conditional requests with 304 and serves
+		precompressed siblings when the client accepts their encoding.
+		"""
+		path = self.translate_path(self.path)
+
+		if os.path.isdir(path):
+			return super().send_head()
+
+		encoding, served = self.__select_encoding(path)
+
+		try:
+			f = open(served, "rb")
+		except OSError:
+			self.send_error(404, "File not found")
+			return None
+
+		try:
+			info = os.fstat(f.fileno())
+			etag = self.__etag(served, info)
+
+			if self.__not_modified(etag, info):
+				f.close()
+				self.send_response(304)
+				self.__send_cache_headers(etag, info)
+				self.end_headers()
+				return None
+
+			self.send_response(200)
+			self.send_header("Content-Type", self.guess_type(path))
+			if encoding is not None:
+				self.send_header("Content-Encoding", encoding)
+			self.send_header("Content-Length", str(info.st_size))
+			self.__send_cache_headers(etag, info)
+			self.end_headers()
+
+			return f
+		except:
+			f.close()
+			raise
+
+	def __send_cache_headers(self, etag, info):
+		self.send_header("ETag", etag)
+		self.send_header("Last-Modified", self.date_time_string(info.st_mtime))
+		self.send_header("Cache-Control", self.cache_policy(self.path))
+		self.send_header("Vary", "Accept-Encoding")
+
+	def __select_encoding(self, path):
+		""" Returns the encoding and file to serve, preferring precompressed siblings that are up to date. """
+		accepted = accepted_encodings(self.headers.get("Accept-Encoding", ""))
+
+		try:
+			mtime = os.stat(path).st_mtime_ns
+		except OSError:
+			return None, path
+
+		for encoding, suffix in ENCODINGS:
+			if encoding in accepted:
+				try:
+					if os.stat(path + suffix).st_mtime_ns >= mtime:
+						return encoding, path + suffix
+				except OSError:
+					continue
+
+		return None, path
+
+	def __etag(self, path, info):
+		""" Returns the ETag of a file, only hashing it again when its size or modification time changed. """
+		key = (info.st_mtime_ns, info.st_size)
+		cached = self.server.etags.get(path)
+
+		if cached is not None and cached[0] == key:
+			return cached[1]
+
+		digest = hashlib.blake2b(digest_size=16)
+		with open(path, "rb") as f:
+			while chunk := f.read(HASH_CHUNK_SIZE):
+				digest.update(chunk)
+
+		etag = f'"{digest.hexdigest()}"'
+		self.server.etags[path] = (key, etag)
+
+		return etag
+
+	def __etag_matches(self, etag):
+		match = self.headers.get("If-None-Match")
+
+		if match is None:
+			return False
+
+		tags = [tag.strip() for tag in match.split(",")]
+		return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+	def __not_modified(self, etag, info):
+		if self.headers.get("If-None-Match") is not None:
+			return self.__etag_matches(etag)
+
+		since = self.headers.get("If-Modified-Since")
+
+		if since is not None:
+			try:
+				date = email.utils.parsedate_to_datetime(since)
+			except (TypeError, ValueError, IndexError, OverflowError):
+				return False
+
+			return date is not None and int(info.st_mtime) <= date.timestamp()
+
+		return False
+
 	def translate_path(self, path):
-		if path.startswith("/@"):
-			module, _, tfile = LOADER.load_module(path[1:])
+		path = self.__asset_path(path)
 
-			reroute = module.get_file_path(tfile)
+		if path.startswith("/@"):
+			reroute = LOADER.file_path(path[1:])
 
 			print(f"- Module received, rerouting: {path} -> {reroute}")
 
@@ -37,20 +356,39 @@ class SWD_Router(serv.SimpleHTTPRequestHandler):
 			else:
 				return super().translate_path(path)
 
-def main(directory):
-	class SWD_Server(serv.ThreadingHTTPServer):
-		def server_bind(self):
-			# suppress exception when protocol is IPv4
-			with contextlib.suppress(Exception):
-				self.socket.setsockopt(
-					socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
-			return super().server_bind()
+class SWD_Server(serv.ThreadingHTTPServer):
+	directory = None
+	notifier = None
+	# (mtime, fingerprinted url -> url) of the asset manifest, read again whenever it changes.
+	manifest = None
+	# Set to render pages on demand, see Project.render_page.
+	project = None
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		# Maps served files to ((mtime, size), ETag), so unchanged files are not hashed again.
+		self.etags = {}
+
+	def server_bind(self):
+		# suppress exception when protocol is IPv4
+		with contextlib.suppress(Exception):
+			self.socket.setsockopt(
+				socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+		return super().server_bind()
+
+	def finish_request(self, request, client_address):
+		self.RequestHandlerClass(request, client_address, self,
+									directory=self.directory)
+
+def main(directory, notifier=None, project=None):
+	class ProjectServer(SWD_Server):
+		pass
 
-		def finish_request(self, request, client_address):
-			self.RequestHandlerClass(request, client_address, self,
-										directory=directory)
+	ProjectServer.directory = directory
+	ProjectServer.notifier = notifier
+	ProjectServer.project = project
 
 	serv.test(
 		HandlerClass=SWD_Router,
-		ServerClass=SWD_Server,
-		port=8080)
\ No newline at end of file
+		ServerClass=ProjectServer,
+		port=8080)
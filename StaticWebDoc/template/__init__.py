@@ -8,6 +8,7 @@ and look at the variables available in StaticWebDoc.Project for what can be over
 - modules/: The directory for modules that are imported with Yarn. Add to .gitignore.
 - scripts/: Your locally defined scripts for the project.
 - style/: Your locally defined styles for the project.
+- .swd/: Cached build state used for incremental builds. Add to .gitignore.
 """
 
 from StaticWebDoc import *
@@ -1,15 +1,34 @@
 import jinja2.filters
 
-def style(path: str) -> str:
+def asset_url(url: str) -> str:
+	""" Returns the url an asset is linked with, which is fingerprinted when the current build fingerprints assets. """
+	import StaticWebDoc
+
+	project = StaticWebDoc.Project.current
+	return url if project is None else project.asset_url(url)
+
+def style_url(path: str) -> str:
 	if path.startswith("@"):
 		module, path = path[1:].split("/", 1)
-		return jinja2.filters.Markup(f'<link rel="stylesheet" type="text/css" href="/@{module}/style/{path}">')
-	else:
-		return jinja2.filters.Markup(f'<link rel="stylesheet" type="text/css" href="/style/{path}">')
+		return f"/@{module}/style/{path}"
 
-def script(path: str, type="module", defer=False) -> str:
+	return f"/style/{path}"
+
+def script_url(path: str) -> str:
 	if path.startswith("@"):
 		module, path = path[1:].split("/", 1)
-		return jinja2.filters.Markup(f'<script src="/@{module}/scripts/{path}" type="{type}" {'defer' if defer else ''}></script>')
-	else:
-		return jinja2.filters.Markup(f'<script src="/scripts/{path}" type="{type}" {'defer' if defer else ''}></script>')
\ No newline at end of file
+		return f"/@{module}/scripts/{path}"
+
+	return f"/scripts/{path}"
+
+def style_tag(url: str) -> str:
+	return jinja2.filters.Markup(f'<link rel="stylesheet" type="text/css" href="{url}">')
+
+def script_tag(url: str, type="module", defer=False) -> str:
+	return jinja2.filters.Markup(f'<script src="{url}" type="{type}" {'defer' if defer else ''}></script>')
+
+def style(path: str) -> str:
+	return style_tag(asset_url(style_url(path)))
+
+def script(path: str, type="module", defer=False) -> str:
+	return script_tag(asset_url(script_url(path)), type, defer)
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Watch mode: keeps a single project alive, and on every change to its templates, modules, styles or scripts renders
+only the affected templates again (through the incremental build) before telling the browser to reload.
+"""
+
+import os
+import pathlib
+import stat
+import time
+
+import jinja2
+
+from StaticWebDoc.exceptions import RenderError, get_jinja_message
+
+POLL_INTERVAL = 0.1
+IGNORED_DIRS = frozenset(["__pycache__", "node_modules"])
+
+class Watcher:
+	"""
+	Polls a set of directories and files for changes. Polling needs no extra dependencies and, with the stat data
+	of a few ten thousand files, still scans well within the poll interval.
+	"""
+
+	def __init__(self, paths, interval=POLL_INTERVAL):
+		self.__paths = paths
+		self.__interval = interval
+		self.__snapshot = self.scan()
+
+	def scan(self):
+		snapshot = {}
+		paths = self.__paths() if callable(self.__paths) else self.__paths
+
+		for path in paths:
+			try:
+				info = os.stat(path)
+			except FileNotFoundError:
+				continue
+
+			if stat.S_ISDIR(info.st_mode):
+				self.__scan_dir(str(path), snapshot)
+			else:
+				snapshot[str(path)] = info.st_mtime_ns
+
+		return snapshot
+
+	def __scan_dir(self, root, snapshot):
+		directories = [root]
+
+		while len(directories) > 0:
+			try:
+				entries = os.scandir(directories.pop())
+			except (FileNotFoundError, NotADirectoryError):
+				continue
+
+			with entries:
+				for entry in entries:
+					if entry.name.startswith(".") or entry.name in IGNORED_DIRS:
+						continue
+
+					try:
+						if entry.is_dir():
+							directories.append(entry.path)
+						else:
+							snapshot[entry.path] = entry.stat().st_mtime_ns
+					except FileNotFoundError:
+						continue
+
+	def changes(self):
+		""" Returns every path that was added, removed or modified since the last call. """
+		current = self.scan()
+		previous = self.__snapshot
+		self.__snapshot = current
+
+		return { p for p in current.keys() | previous.keys() if current.get(p) != previous.get(p) }
+
+	def __iter__(self):
+		while True:
+			changes = self.changes()
+
+			if len(changes) > 0:
+				yield changes
+			else:
+				time.sleep(self.__interval)
+
+def needs_render(project, changes):
+	assets = project.asset_dirs()
+
+	for change in changes:
+		path = pathlib.Path(change)
+		if not any(path.is_relative_to(d) for d in assets):
+			return True
+
+	return False
+
+def rebuild(project, jobs=1):
+	"""
+	Renders the project, reporting errors instead of raising them so that watching can continue once the template
+	is fixed.
+	"""
+	try:
+		project.render(jobs=jobs)
+		return True
+	except jinja2.exceptions.TemplateError as ex:
+		project.logger.error(get_jinja_message(ex))
+	except RenderError as ex:
+		project.logger.error(f"[Error] {type(ex).__name__}: {ex.message}")
+	except Exception as ex:
+		project.logger.error(f"[Error] {type(ex).__name__}: {ex}")
+
+	return False
+
+def watch(project, notify=None, jobs=1, interval=POLL_INTERVAL):
+	"""
+	Watches the project until interrupted. notify is called without arguments after every change that was
+	successfully rendered (or that only touched assets).
+	"""
+	rebuild(project, jobs)
+	watcher = Watcher(project.watch_paths, interval)
+
+	project.logger.normal("[Watching] for changes, press Ctrl+C to stop.", "green")
+
+	for changes in watcher:
+		for change in sorted(changes):
+			project.logger.normal(f"- Changed: {change}")
+
+		start = time.perf_counter()
+
+		if needs_render(project, changes) and not rebuild(project, jobs):
+			continue
+
+		project.logger.normal(f"[Rebuilt] in {time.perf_counter() - start:.3f}s", "green")
+
+		if notify is not None:
+			notify()
+
+__all__ = [
+	"Watcher",
+	"watch",
+]
@@ -0,0 +1,20 @@
+"""
+Benchmarks for StaticWebDoc. The full pipeline benchmark runs on a generated project:
+
+	python -m benchmarks --templates 2000 --output results.json
+
+Every other module can be run on its own as well, for example:
+
+	python -m benchmarks.compile_cache --templates 2000
+	python -m benchmarks.beautify --rows 20000
+	python -m benchmarks.serialize --objects 1000000
+	python -m benchmarks.synthetic path/to/project --templates 500
+"""
+import time
+import contextlib
+
+@contextlib.contextmanager
+def timer(results, name):
+	start = time.perf_counter()
+	yield
+	results[name] = time.perf_counter() - start
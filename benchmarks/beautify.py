@@ -0,0 +1,73 @@
+"""
+Compares the built in streaming beautifier with the BeautifulSoup prettify() path it replaced, on large generated
+pages. Reports time and peak traced memory for each.
+"""
+
+import argparse
+import io
+import tracemalloc
+
+from StaticWebDoc.beautify import HTMLBeautifier, beautify
+from benchmarks import timer
+
+ROW = """<tr class="row-{i}"><td><a href="/document/pages/p{i}.html">Page {i}</a></td>
+<td>Some <b>bold</b> &amp; <i>italic</i> text for row {i}</td><td><img src="/images/{i}.png" alt="{i}"></td></tr>
+"""
+
+def generate_page(rows):
+	body = "".join(ROW.format(i=i) for i in range(rows))
+	return (
+		"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Catalog</title>"
+		"<script type=\"module\">console.log(1 < 2)</script></head>"
+		f"<body><div class=\"catalog\"><table>{body}</table><pre>  kept\n  as is</pre></div></body></html>")
+
+def measure(results, name, fn):
+	# Timing and memory tracing are separate runs, since tracemalloc slows allocations down considerably.
+	with timer(results, f"{name}_seconds"):
+		fn()
+
+	tracemalloc.start()
+	fn()
+	results[f"{name}_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+def prettify(page):
+	from bs4 import BeautifulSoup as bs
+	return bs(page, features="html.parser").prettify()
+
+def stream(page, chunk_size=1 << 16):
+	output = io.StringIO()
+	beautifier = HTMLBeautifier(output.write)
+
+	for i in range(0, len(page), chunk_size):
+		beautifier.feed(page[i:i + chunk_size])
+
+	beautifier.close()
+
+def run(rows, compare=True):
+	page = generate_page(rows)
+	results = { "rows": rows, "page_bytes": len(page) }
+
+	measure(results, "beautify", lambda: beautify(page))
+	measure(results, "stream", lambda: stream(page))
+
+	if compare:
+		measure(results, "bs4", lambda: prettify(page))
+
+	return results
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks the HTML beautifier against bs4.prettify().")
+	parser.add_argument("--rows", type=int, default=20000)
+	parser.add_argument("--no-bs4", action="store_true", help="Skips the BeautifulSoup comparison.")
+	args = parser.parse_args()
+
+	results = run(args.rows, compare=not args.no_bs4)
+
+	print(f"Page size: {results['page_bytes'] / 1e6:.1f} MB")
+	for name in ["bs4", "beautify", "stream"]:
+		if f"{name}_seconds" in results:
+			print(f"{name:>10}: {results[f'{name}_seconds']:.3f}s, peak {results[f'{name}_peak_bytes'] / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,109 @@
+"""
+Measures how much compile time the on disk compiled-template cache saves per build. Every generated template uses
+the custom fieldblock/data/datasection/extern tags, and every page imports a template from a generated @module,
+so both CustomLoader paths are covered.
+"""
+
+import argparse
+import pathlib
+import sys
+import tempfile
+
+import StaticWebDoc.extensions as extensions
+import StaticWebDoc.loader as loader
+
+from StaticWebDoc.environment import CustomEnvironment, CompiledTemplateCache
+from benchmarks import timer
+
+MODULE_NAME = "swd_bench_module"
+
+PAGE = """{% extends "base.jinja.html" %}
+{% block body %}
+{% extern "MODULE/widget" as widget %}
+{% fieldblock name %}Page INDEX{% endfieldblock %}
+{% fieldblock summary %}<p>Summary of page INDEX</p>{% endfieldblock %}
+{% datasection page %}
+{% for i in range(10) %}{% data item = i %}{% endfor %}
+{% enddatasection %}
+{% for i in range(20) %}
+<section id="s{{ i }}">{{ widget.card(i) }}{% if i is even %}<em>{{ i * INDEX }}</em>{% endif %}</section>
+{% endfor %}
+{% endblock %}
+""".replace("MODULE", MODULE_NAME)
+
+BASE = """<html><head>{% block head %}{% endblock %}</head><body>{% block body %}{% endblock %}</body></html>"""
+WIDGET = """{% macro card(value) %}<div class="card">{{ value }}</div>{% endmacro %}"""
+
+def generate(root, count):
+	templates = root/"template"
+	templates.mkdir(parents=True)
+	(templates/"base.jinja.html").write_text(BASE)
+
+	for i in range(count):
+		(templates/f"page{i}.jinja").write_text(PAGE.replace("INDEX", str(i)))
+
+	module = root/"modules"/MODULE_NAME
+	(module/"template").mkdir(parents=True)
+	(module/"__init__.py").write_text(
+		"from StaticWebDoc.modules import Module\n\nclass BenchModule(Module):\n\tpass\n")
+	(module/"template"/"widget.jinja").write_text(WIDGET)
+
+	sys.path.insert(0, str(root/"modules"))
+
+	return [f"page{i}.jinja" for i in range(count)] + ["base.jinja.html", f"@{MODULE_NAME}/widget.jinja"]
+
+def make_environment(root, cache_dir):
+	env = CustomEnvironment(
+		loader=loader.CustomLoader([root/"template"]),
+		extensions=[
+			extensions.FragmentCacheExtension,
+			extensions.EmbeddedDataExtension,
+			extensions.EmbeddedDataSectionExtension,
+			extensions.ExternalModuleExtension])
+
+	if cache_dir is not None:
+		env.bytecode_cache = CompiledTemplateCache(cache_dir, env)
+
+	return env
+
+def load_all(env, names):
+	for name in names:
+		env.get_template(name)
+
+def run(count):
+	results = {}
+
+	with tempfile.TemporaryDirectory() as tmp:
+		root = pathlib.Path(tmp)
+		names = generate(root, count)
+		cache_dir = root/".swd"/"bytecode"
+
+		with timer(results, "uncached"):
+			load_all(make_environment(root, None), names)
+
+		with timer(results, "cold_cache"):
+			load_all(make_environment(root, cache_dir), names)
+
+		with timer(results, "warm_cache"):
+			load_all(make_environment(root, cache_dir), names)
+
+	results["saved"] = results["uncached"] - results["warm_cache"]
+	results["templates"] = len(names)
+
+	return results
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks the compiled-template cache.")
+	parser.add_argument("--templates", type=int, default=1000)
+	args = parser.parse_args()
+
+	results = run(args.templates)
+
+	print(f"Templates:            {results['templates']}")
+	print(f"Without cache:        {results['uncached']:.3f}s")
+	print(f"Cold cache (write):   {results['cold_cache']:.3f}s")
+	print(f"Warm cache (load):    {results['warm_cache']:.3f}s")
+	print(f"Compile time saved:   {results['saved']:.3f}s per build")
+
+if __name__ == "__main__":
+	main()
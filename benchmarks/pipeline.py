@@ -0,0 +1,238 @@
+"""
+Benchmarks the full build pipeline on a synthetic project: rendering with beautify on and off, cold and warm,
+writing the data output, packaging and serving. Every scenario runs in a fresh process (Project.current only allows
+one project per process), and the results are written as JSON so they can be compared between commits:
+
+	python -m benchmarks --templates 2000 --output before.json
+	python -m benchmarks --templates 2000 --output after.json --compare before.json
+
+Scenarios run in the listed order on the same generated project, so the warm scenarios (render_noop,
+render_one_change, render_full_warm, package_warm) measure against the state left by the ones before them.
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import dataclasses
+import datetime
+import importlib.util
+import io
+import json
+import multiprocessing
+import pathlib
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import StaticWebDoc.logging as logging
+
+from benchmarks import synthetic, timer
+
+RESULTS_VERSION = 1
+
+class QuietLogger(logging.Logger):
+	def normal(self, msg, color=None):
+		pass
+
+def load_project(root, modules):
+	sys.path.insert(0, str(modules))
+
+	spec = importlib.util.spec_from_file_location(root.name, root/"__init__.py")
+	code = importlib.util.module_from_spec(spec)
+	# Registered under its name, so that render workers can pickle the objects of the project types it defines.
+	sys.modules.setdefault(spec.name, code)
+	spec.loader.exec_module(code)
+
+	project = getattr(code, synthetic.PROJECT_CLASS)(root)
+	project.logger = QuietLogger()
+
+	return project
+
+def reset_build(root):
+	""" Removes every output and cached state, so that the next render is a cold build. """
+	for directory in ["render", ".swd"]:
+		shutil.rmtree(root/directory, ignore_errors=True)
+
+def timed_render(project, results, flags, jobs=1):
+	import StaticWebDoc
+
+	write_data = project._Project__write_data
+
+	# __write_data is private, so time it by wrapping the name mangled attribute render() calls.
+	def timed_write_data():
+		with timer(results, "write_data_seconds"):
+			write_data()
+
+	project._Project__write_data = timed_write_data
+
+	with timer(results, "seconds"):
+		project.render(StaticWebDoc.BuildFlags(**flags), jobs=jobs)
+
+def render_cold_beautify(project, root, options, results):
+	reset_build(root)
+	timed_render(project, results, { "beautify": True })
+
+def render_cold_minify(project, root, options, results):
+	reset_build(root)
+	timed_render(project, results, { "beautify": False })
+
+def render_noop(project, root, options, results):
+	timed_render(project, results, { "beautify": True })
+
+def render_one_change(project, root, options, results):
+	path = root/"template"/synthetic.page_name(options.config, 0)
+	path.write_text(path.read_text() + f"<!-- {time.time()} -->\n")
+	timed_render(project, results, { "beautify": True })
+
+def render_full_warm(project, root, options, results):
+	timed_render(project, results, { "beautify": True, "incremental": False })
+
+def render_parallel(project, root, options, results):
+	reset_build(root)
+	results["jobs"] = options.jobs
+	timed_render(project, results, { "beautify": True }, jobs=options.jobs)
+
+def package_cold(project, root, options, results):
+	shutil.rmtree(root/f"../{project.build}", ignore_errors=True)
+
+	with timer(results, "seconds"):
+		report = project.package()
+
+	results.update(dataclasses.asdict(report))
+
+def package_warm(project, root, options, results):
+	with timer(results, "seconds"):
+		report = project.package()
+
+	results.update(dataclasses.asdict(report))
+
+def serve(project, root, options, results):
+	import StaticWebDoc.server as server
+
+	class QuietRouter(server.SWD_Router):
+		def log_message(self, format, *args):
+			pass
+
+	httpd = server.SWD_Server(("127.0.0.1", 0), QuietRouter)
+	httpd.directory = str(root)
+	thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+	thread.start()
+
+	port = httpd.server_address[1]
+	rng = random.Random(options.config.seed)
+	pages = [synthetic.page_name(options.config, i) for i in range(options.config.templates)]
+	paths = [f"/document/{p[:-len('.jinja')]}.html" for p in pages]
+	paths += ["/data/embedded_data.json", f"/@{synthetic.MODULE_NAME}/style/widget.css", "/style/main.css"]
+	requests = [rng.choice(paths) for _ in range(options.requests)]
+
+	def fetch(path):
+		with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}") as response:
+			return len(response.read())
+
+	# The router prints every module request, which would end up in the JSON results on stdout.
+	with contextlib.redirect_stdout(io.StringIO()):
+		with concurrent.futures.ThreadPoolExecutor(options.concurrency) as pool:
+			with timer(results, "seconds"):
+				transferred = sum(pool.map(fetch, requests))
+
+	httpd.shutdown()
+	httpd.server_close()
+
+	results["requests"] = len(requests)
+	results["requests_per_second"] = len(requests) / results["seconds"]
+	results["bytes"] = transferred
+
+SCENARIOS = {
+	"render_cold_beautify": render_cold_beautify,
+	"render_noop": render_noop,
+	"render_one_change": render_one_change,
+	"render_full_warm": render_full_warm,
+	"render_cold_minify": render_cold_minify,
+	"render_parallel": render_parallel,
+	"package_cold": package_cold,
+	"package_warm": package_warm,
+	"serve": serve,
+}
+
+def run_scenario(name, root, modules, options):
+	# Runs inside of a fresh process.
+	project = load_project(root, modules)
+	results = {}
+	SCENARIOS[name](project, root, options, results)
+
+	return results
+
+def git_commit():
+	try:
+		output = subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=pathlib.Path(__file__).parent)
+		return output.stdout.strip() or None
+	except OSError:
+		return None
+
+def run(options):
+	scenarios = options.scenarios or [s for s in SCENARIOS if s != "render_parallel" or options.jobs > 1]
+	context = multiprocessing.get_context("spawn")
+	report = {
+		"version": RESULTS_VERSION,
+		"commit": git_commit(),
+		"timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+		"python": sys.version.split()[0],
+		"config": dataclasses.asdict(options.config),
+		"results": {}
+	}
+
+	with tempfile.TemporaryDirectory() as tmp:
+		root = pathlib.Path(tmp)/"project"
+		modules = synthetic.generate(root, options.config)
+
+		for name in scenarios:
+			with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+				result = executor.submit(run_scenario, name, root, modules, options).result()
+
+			report["results"][name] = result
+			print(f"{name:>22}: {result['seconds']:.3f}s", file=sys.stderr)
+
+	return report
+
+def compare(report, baseline):
+	print(f"{'scenario':>22} {'baseline':>10} {'current':>10} {'ratio':>7}")
+
+	for name, result in report["results"].items():
+		if name not in baseline["results"]:
+			continue
+
+		before = baseline["results"][name]["seconds"]
+		after = result["seconds"]
+		print(f"{name:>22} {before:>9.3f}s {after:>9.3f}s {after / before:>6.2f}x")
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks the StaticWebDoc build pipeline on a synthetic project.")
+	synthetic.add_arguments(parser)
+	parser.add_argument("--scenario", dest="scenarios", action="append", choices=list(SCENARIOS))
+	parser.add_argument("--jobs", type=int, default=1, help="Processes used by the render_parallel scenario.")
+	parser.add_argument("--requests", type=int, default=2000, help="Requests made by the serve scenario.")
+	parser.add_argument("--concurrency", type=int, default=8)
+	parser.add_argument("--output", type=str, help="Writes the results to a JSON file instead of stdout.")
+	parser.add_argument("--compare", type=str, help="Results of an earlier run to compare with.")
+	args = parser.parse_args()
+	args.config = synthetic.config_from_args(args)
+
+	report = run(args)
+	encoded = json.dumps(report, indent=2)
+
+	if args.output is None:
+		print(encoded)
+	else:
+		pathlib.Path(args.output).write_text(encoded)
+
+	if args.compare is not None:
+		compare(report, json.loads(pathlib.Path(args.compare).read_text()))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,108 @@
+"""
+Measures how long serializing embedded data takes: many small objects, most of them JSON classes with JSONValue
+attributes (which orjson hands to JSONEncoder one by one) and dataclasses. The previous implementation, which
+walked dir() of every object and deep copied dataclasses with asdict(), is kept here for comparison, and both
+have to produce the same bytes.
+"""
+
+import argparse
+import dataclasses
+
+import orjson
+
+import StaticWebDoc.extensions as extensions
+
+from benchmarks import timer
+
+class Entry(extensions.JSON):
+	kind = extensions.JSONValue("entry")
+
+	def __init__(self, index):
+		self.index = extensions.JSONValue(index)
+		self.name = extensions.JSONValue(f"entry {index}")
+		self.tags = extensions.JSONValue({"static", "web"} if index % 2 else set())
+		self.parent = index // 10
+
+	@property
+	def label(self):
+		return extensions.JSONValue(f"#{self.index.value}")
+
+@dataclasses.dataclass
+class Point(extensions.JSON):
+	x: int
+	y: int
+
+@dataclasses.dataclass
+class Shape(extensions.JSON):
+	name: str
+	points: list
+
+def legacy_json(obj):
+	serial = { "type": type(obj).__name__ }
+
+	if dataclasses.is_dataclass(obj):
+		serial = {**serial, **dataclasses.asdict(obj)}
+	else:
+		for attr in dir(obj):
+			value = getattr(obj, attr)
+			if isinstance(value, extensions.JSONValue):
+				serial[attr] = value.value
+
+	return serial
+
+def legacy_encoder(obj):
+	if isinstance(obj, extensions.JSON):
+		return legacy_json(obj)
+	elif isinstance(obj, set):
+		return list(obj)
+	else:
+		raise TypeError
+
+def generate(count):
+	return {
+		"entries": [Entry(i) for i in range(count)],
+		"shapes": [Shape(f"shape {i}", [Point(i, j) for j in range(3)]) for i in range(count // 10)]
+	}
+
+def run(count):
+	results = {}
+	data = generate(count)
+	shapes = data["shapes"]
+
+	with timer(results, "legacy_encoder"):
+		legacy = orjson.dumps(data, default=legacy_encoder)
+
+	with timer(results, "encoder"):
+		compiled = orjson.dumps(data, default=extensions.JSONEncoder())
+
+	# Dataclasses only go through json() when it is called directly.
+	with timer(results, "legacy_dataclass_json"):
+		legacy_shapes = orjson.dumps([legacy_json(shape) for shape in shapes])
+
+	with timer(results, "dataclass_json"):
+		compiled_shapes = orjson.dumps([shape.json() for shape in shapes])
+
+	if legacy != compiled or legacy_shapes != compiled_shapes:
+		raise AssertionError("The compiled serializers produced different output.")
+
+	results["objects"] = count + len(shapes) * 4
+	results["bytes"] = len(compiled)
+
+	return results
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks serializing embedded data objects.")
+	parser.add_argument("--objects", type=int, default=1000000)
+	args = parser.parse_args()
+
+	results = run(args.objects)
+
+	print(f"Objects:                  {results['objects']} ({results['bytes'] / 1e6:.1f} MB)")
+	print(f"dir() walk:               {results['legacy_encoder']:.3f}s")
+	print(f"Compiled serializers:     {results['encoder']:.3f}s")
+	print(f"Speedup:                  {results['legacy_encoder'] / results['encoder']:.1f}x")
+	print(f"asdict() json():          {results['legacy_dataclass_json']:.3f}s")
+	print(f"Compiled dataclass json():{results['dataclass_json']:.3f}s")
+
+if __name__ == "__main__":
+	main()
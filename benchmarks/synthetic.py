@@ -0,0 +1,190 @@
+"""
+Generates synthetic StaticWebDoc projects for benchmarking. The shape of the project is controlled by SyntheticConfig,
+and the same config and seed always generate the same project.
+"""
+
+import argparse
+import dataclasses
+import pathlib
+import random
+
+MODULE_NAME = "swd_bench_module"
+PROJECT_CLASS = "SyntheticProject"
+
+WORDS = (
+	"static web document template render field block data section module style script page index catalog "
+	"entry author tag navigation summary content build output cache").split()
+
+PROJECT = f"""from StaticWebDoc import *
+
+class {PROJECT_CLASS}(Project):
+	pass
+"""
+
+BASE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{% block title %}{% endblock %}</title>
+{{ style("main.css") }}
+{{ imported_styles() }}
+</head>
+<body>
+<nav>{% block nav %}{% endblock %}</nav>
+<main>{% block body %}{% endblock %}</main>
+{{ script("main.js") }}
+{{ imported_scripts() }}
+</body>
+</html>
+"""
+
+INDEX = """{% extends "base.jinja.html" %}
+{% block title %}Index{% endblock %}
+{% block body %}
+{% fieldblock name %}Index{% endfieldblock %}
+<ul>
+{% for page in iter_template("pages/**/*.jinja") %}
+<li>{{ link_to(page) }}: {{ get_field(page, "summary") }}</li>
+{% endfor %}
+</ul>
+{% endblock %}
+"""
+
+MODULE = """from StaticWebDoc.modules import Module
+
+class SyntheticModule(Module):
+	pass
+"""
+
+WIDGET = """{% macro card(title, body) %}<div class="card"><h3>{{ title }}</h3><div>{{ body }}</div></div>{% endmacro %}"""
+
+@dataclasses.dataclass
+class SyntheticConfig:
+	# Number of pages, not counting the index page.
+	templates: int = 500
+	# Number of directories between pages/ and each page, and how many directories each level has.
+	depth: int = 2
+	fanout: int = 8
+	# Number of get_field lookups of other pages on every page (except the first).
+	cross_refs: int = 3
+	# Number of {% data %} entries in the datasection of every page, and the size of each payload in characters.
+	data_items: int = 5
+	data_size: int = 200
+	# Every n-th page pulls in a @module template through {% extern %} (0 disables modules).
+	extern_every: int = 2
+	# Approximate size of the generated body of every page in bytes.
+	page_size: int = 8192
+	# Number and size of the files in images/, which are only copied when packaging.
+	images: int = 20
+	image_size: int = 65536
+	seed: int = 0
+
+def page_name(config, index):
+	parts = ["pages"]
+	for level in range(config.depth):
+		parts.append(f"section{(index // config.fanout ** level) % config.fanout}")
+
+	return "/".join(parts + [f"page{index}.jinja"])
+
+def paragraphs(rng, size):
+	result = []
+	total = 0
+
+	while total < size:
+		text = " ".join(rng.choice(WORDS) for _ in range(40))
+		result.append(f"<p>{text}</p>")
+		total += len(text) + 7
+
+	return "\n".join(result)
+
+def page(config, rng, index):
+	lines = ['{% extends "base.jinja.html" %}', f"{{% block title %}}Page {index}{{% endblock %}}", "{% block body %}"]
+	use_module = config.extern_every > 0 and index % config.extern_every == 0
+
+	if use_module:
+		lines.append(f'{{% extern "{MODULE_NAME}/widget" as widget %}}')
+
+	lines.append(f"{{% fieldblock name %}}Page {index}{{% endfieldblock %}}")
+	lines.append(f"{{% fieldblock summary %}}<em>Summary</em> of page {index}{{% endfieldblock %}}")
+
+	# Pages only reference pages with a lower index, since get_field cycles can not be rendered.
+	if config.cross_refs > 0 and index > 0:
+		lines.append("<ul>")
+		for _ in range(config.cross_refs):
+			target = page_name(config, rng.randrange(index))
+			lines.append(f'<li>{{{{ link_to("{target}") }}}} {{{{ get_field("{target}", "summary") }}}}</li>')
+		lines.append("</ul>")
+
+	if config.data_items > 0:
+		lines.append("{% datasection page %}")
+		for item in range(config.data_items):
+			payload = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(config.data_size))
+			lines.append(f'{{% data item{item} = "{payload}" %}}')
+		lines.append("{% enddatasection %}")
+
+	if use_module:
+		lines.append(f'{{{{ widget.card("Widget {index}", "Module content") }}}}')
+
+	lines.append(paragraphs(rng, config.page_size))
+	lines.append("{% endblock %}")
+
+	return "\n".join(lines) + "\n"
+
+def generate(root, config):
+	"""
+	Writes a project to root and returns the directory holding the generated @module, which needs to be on the
+	python path when rendering.
+	"""
+	root = pathlib.Path(root)
+	rng = random.Random(config.seed)
+
+	template = root/"template"
+	template.mkdir(parents=True, exist_ok=True)
+
+	(root/"__init__.py").write_text(PROJECT)
+	(template/"base.jinja.html").write_text(BASE)
+	(template/"index.jinja").write_text(INDEX)
+
+	for index in range(config.templates):
+		path = template/page_name(config, index)
+		path.parent.mkdir(parents=True, exist_ok=True)
+		path.write_text(page(config, rng, index))
+
+	for directory, name, content in [("style", "main.css", "body { margin: 0 }\n"), ("scripts", "main.js", "export {};\n")]:
+		(root/directory).mkdir(exist_ok=True)
+		(root/directory/name).write_text(content * 100)
+
+	(root/"images").mkdir(exist_ok=True)
+	for index in range(config.images):
+		(root/"images"/f"image{index}.bin").write_bytes(rng.randbytes(config.image_size))
+
+	modules = root/"modules"
+	module = modules/MODULE_NAME
+
+	for directory in ["template", "style", "scripts"]:
+		(module/directory).mkdir(parents=True, exist_ok=True)
+
+	(module/"__init__.py").write_text(MODULE)
+	(module/"template"/"widget.jinja").write_text(WIDGET)
+	(module/"style"/"widget.css").write_text(".card { padding: 1em }\n")
+	(module/"scripts"/"widget.js").write_text("export const widget = true;\n")
+
+	return modules
+
+def add_arguments(parser):
+	for field in dataclasses.fields(SyntheticConfig):
+		parser.add_argument(f"--{field.name.replace('_', '-')}", type=field.type, default=field.default)
+
+def config_from_args(args):
+	return SyntheticConfig(**{ f.name: getattr(args, f.name) for f in dataclasses.fields(SyntheticConfig) })
+
+def main():
+	parser = argparse.ArgumentParser(description="Generates a synthetic StaticWebDoc project.")
+	parser.add_argument("root", type=str)
+	add_arguments(parser)
+	args = parser.parse_args()
+
+	generate(args.root, config_from_args(args))
+
+if __name__ == "__main__":
+	main()
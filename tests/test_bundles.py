@@ -0,0 +1,91 @@
+import time
+
+import StaticWebDoc
+import StaticWebDoc.bundles as bundles
+
+from benchmarks import pipeline, synthetic
+
+def bundler(tmp_path, scripts):
+	for name, text in scripts.items():
+		(tmp_path/name).write_text(text)
+
+	return bundles.Bundler(tmp_path/"bundles", "/data/bundles", lambda url: tmp_path/url.rsplit("/", 1)[1])
+
+def test_scripts_keep_their_own_scope(tmp_path):
+	bundle = bundler(tmp_path, { "a.js": "var x = 1;\n", "b.js": "var x = 2;\nawait null;\n" })
+	links, sources = bundle.bundle(["/scripts/a.js", "/scripts/b.js"], bundles.SCRIPT_SUFFIX)
+	[(url, bundled)] = links
+
+	content = (tmp_path/"bundles"/url.rsplit("/", 1)[1]).read_text()
+
+	assert bundled
+	assert content.count("await (async () => {\n") == 2
+
+def test_modules_and_their_imports_are_not_bundled(tmp_path):
+	bundle = bundler(tmp_path, {
+		"dynamic.js": 'const c = await import("./c.js");\n',
+		"meta.js": "console.log(import.meta.url);\n",
+		"main.js": 'import { d } from "./d.js";\n',
+		"d.js": 'import "./e.js";\nexport const d = 1;\n',
+		"e.js": 'console.log("e");\n',
+		"plain.js": 'console.log("plain");\n'
+	})
+	urls = [f"/scripts/{name}" for name in ["dynamic.js", "meta.js", "main.js", "e.js", "plain.js", "missing.js"]]
+
+	links, sources = bundle.bundle(urls, bundles.SCRIPT_SUFFIX)
+
+	assert [source.name for source in sources] == ["plain.js"]
+	assert [url for url, bundled in links if not bundled] == [u for u in urls if u != "/scripts/plain.js"]
+
+def test_bundles_keep_the_import_order(tmp_path):
+	bundle = bundler(tmp_path, {
+		"a.js": 'window.order = ["a"];\n',
+		"module.js": 'window.order.push("module");\nexport {};\n',
+		"b.js": 'window.order.push("b");\n',
+		"c.js": 'window.order.push("c");\n'
+	})
+	urls = [f"/scripts/{name}" for name in ["a.js", "module.js", "b.js", "c.js"]]
+
+	links, sources = bundle.bundle(urls, bundles.SCRIPT_SUFFIX)
+	contents = [(tmp_path/"bundles"/url.rsplit("/", 1)[1]).read_text() if bundled else url for url, bundled in links]
+
+	assert [bundled for _, bundled in links] == [True, False, True]
+	assert "a.js" in contents[0] and "b.js" not in contents[0]
+	assert contents[1] == "/scripts/module.js"
+	assert contents[2].index("b.js") < contents[2].index("c.js")
+
+def test_markers_take_the_indentation_of_their_line(tmp_path):
+	page = f" <head>\n  {bundles.STYLES_MARKER}\n </head>\n <body>\n  {bundles.SCRIPTS_MARKER}\n </body>\n"
+	links = { bundles.STYLES_MARKER: "<link href=a.css/>\n<link href=b.css/>", bundles.SCRIPTS_MARKER: "" }
+	expected = " <head>\n  <link href=a.css/>\n  <link href=b.css/>\n </head>\n <body>\n </body>\n"
+
+	assert bundles.link_markers(page, links) == expected
+
+	(tmp_path/"page.html").write_text(page)
+
+	for chunk_size in [1, 7, 1 << 16]:
+		bundles.replace_markers(tmp_path/"page.html", tmp_path/"linked.html", links, chunk_size)
+		assert (tmp_path/"linked.html").read_text() == expected
+
+def test_bundles_no_page_links_are_removed(tmp_path):
+	root = tmp_path/"p"
+	modules = synthetic.generate(root, synthetic.SyntheticConfig(templates=4))
+	project = pipeline.load_project(root, modules)
+	bundle_dir = root/"render"/"data"/bundles.BUNDLE_DIR
+
+	try:
+		project.render(StaticWebDoc.BuildFlags(bundle=True))
+		before = { path.name for path in bundle_dir.iterdir() }
+
+		time.sleep(0.01)
+		style = next(modules.rglob("widget.css"))
+		style.write_text(style.read_text() + ".changed { color: red }\n")
+		project.render(StaticWebDoc.BuildFlags(bundle=True))
+	finally:
+		StaticWebDoc.Project.current = None
+
+	after = { path.name for path in bundle_dir.iterdir() }
+	page = (root/"render"/"document"/synthetic.page_name(synthetic.SyntheticConfig(), 0)).with_suffix(".html").read_text()
+
+	assert len(before) == 1 and len(after) == 1 and before != after
+	assert all(name in page for name in after)
@@ -0,0 +1,53 @@
+import types
+
+import orjson
+import pytest
+
+import StaticWebDoc
+import StaticWebDoc.extensions as extensions
+
+def embedded_data():
+	project = types.SimpleNamespace(
+		json_flags=orjson.OPT_INDENT_2, shard_embedded_data=False, intern_embedded_data=False, object_file="o.json")
+
+	return extensions.EmbeddedData(types.SimpleNamespace(project=project))
+
+def add(data, templates):
+	data.data_env = "page"
+	for template in templates:
+		data[template, "title"] = template
+
+def test_single_file_is_ordered_by_template(tmp_path):
+	""" Templates are added in the order they are rendered, which differs between builds. """
+	incremental = embedded_data()
+	add(incremental, ["d", "b"])
+	incremental.write(tmp_path)
+
+	# Added before the last template in the file, and after it.
+	for added in [["c", "a"], ["e"]]:
+		add(incremental, added)
+		incremental.write(tmp_path)
+
+	clean = embedded_data()
+	add(clean, ["e", "a", "c", "b", "d"])
+	(tmp_path/"clean").mkdir()
+	clean.write(tmp_path/"clean")
+
+	written = (tmp_path/extensions.EMBEDDED_DATA_FILE).read_bytes()
+
+	assert [entry["page"]["title"] for entry in orjson.loads(written)] == ["a", "b", "c", "d", "e"]
+	assert written == (tmp_path/"clean"/extensions.EMBEDDED_DATA_FILE).read_bytes()
+
+def test_data_that_can_not_be_serialized_names_its_template(tmp_path):
+	data = embedded_data()
+	add(data, ["a"])
+	data.write(tmp_path)
+	written = (tmp_path/extensions.EMBEDDED_DATA_FILE).read_bytes()
+
+	data[("b", "value")] = object()
+
+	with pytest.raises(StaticWebDoc.RenderError) as error:
+		data.write(tmp_path)
+
+	assert error.value.template == "b.jinja"
+	assert (tmp_path/extensions.EMBEDDED_DATA_FILE).read_bytes() == written
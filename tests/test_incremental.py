@@ -0,0 +1,105 @@
+import pathlib
+import shutil
+import time
+
+import StaticWebDoc
+
+from benchmarks import pipeline, synthetic
+
+PROJECT = f"""import dataclasses
+
+from StaticWebDoc import *
+from StaticWebDoc.extensions import JSON
+
+@proj_type
+@dataclasses.dataclass
+class Author(JSON):
+	name: str
+
+	def greet(self):
+		return f"Hello {{self.name}}"
+
+class {synthetic.PROJECT_CLASS}(Project):
+	pass
+"""
+
+def test_relative_project_dir_builds_twice(tmp_path, monkeypatch):
+	""" The command line passes the project directory as given, which is usually relative. """
+	monkeypatch.chdir(tmp_path)
+	root = pathlib.Path("p")
+	modules = synthetic.generate(root, synthetic.SyntheticConfig(templates=8))
+
+	project = pipeline.load_project(root, modules)
+
+	try:
+		project.render(StaticWebDoc.BuildFlags())
+		# The second build is incremental, and selects templates through the LastModified filter.
+		project.render(StaticWebDoc.BuildFlags())
+	finally:
+		StaticWebDoc.Project.current = None
+
+	assert (root/"render"/"document"/"index.html").is_file()
+
+def project_type_project(root):
+	(root/"template").mkdir(parents=True)
+	(root/"__init__.py").write_text(PROJECT)
+	(root/"template"/"author.jinja").write_text(
+		'{% datasection page %}{% data author = Author("Ann") %}{% enddatasection %}<p>Author</p>\n')
+	(root/"template"/"index.jinja").write_text('<p>{{ env_data("page", "author", template="author").greet() }}</p>\n')
+
+def rendered(root):
+	return { path.relative_to(root): path.read_bytes() for path in sorted(root.rglob("*")) if path.is_file() }
+
+def test_incremental_build_keeps_project_types(tmp_path, monkeypatch):
+	""" Embedded data restored from the previous build are JSON values, not the project objects they were. """
+	monkeypatch.setattr(StaticWebDoc, "GLOBAL_PROJECT_TYPES", [])
+	root = tmp_path/"p"
+	project_type_project(root)
+
+	project = pipeline.load_project(root, root)
+
+	def build():
+		# A new project restores the state of the previous build, as a new process would.
+		StaticWebDoc.Project.current = None
+		type(project)(root).render(StaticWebDoc.BuildFlags())
+
+	try:
+		project.render(StaticWebDoc.BuildFlags())
+
+		time.sleep(0.01)
+		index = root/"template"/"index.jinja"
+		index.write_text(index.read_text() + "<p>Edited</p>\n")
+		build()
+		incremental = rendered(root/"render")
+
+		for directory in ["render", ".swd"]:
+			shutil.rmtree(root/directory)
+		build()
+	finally:
+		StaticWebDoc.Project.current = None
+
+	assert b"Hello Ann" in incremental[pathlib.Path("document/index.html")]
+	assert incremental == rendered(root/"render")
+
+def test_stale_compiled_templates_are_pruned(tmp_path):
+	root = tmp_path/"pruned"
+	config = synthetic.SyntheticConfig(templates=8)
+	modules = synthetic.generate(root, config)
+	project = pipeline.load_project(root, modules)
+	bytecode = root/StaticWebDoc.DEFAULT_CACHE_DIR/StaticWebDoc.BYTECODE_DIR
+
+	try:
+		project.render(StaticWebDoc.BuildFlags())
+		before = { path.name for path in bytecode.iterdir() }
+
+		# A bucket compiled with other settings, and the one of a deleted template (pages only reference pages with a
+		# lower index).
+		(bytecode/"__jinja2_0123456789abcdef.cache").write_bytes(b"stale")
+		(root/"template"/synthetic.page_name(config, config.templates - 1)).unlink()
+		project.render(StaticWebDoc.BuildFlags())
+	finally:
+		StaticWebDoc.Project.current = None
+
+	after = { path.name for path in bytecode.iterdir() }
+
+	assert len(after) == len(before) - 1 and after < before
@@ -0,0 +1,54 @@
+import gzip
+import time
+
+import StaticWebDoc
+import StaticWebDoc.packaging as packaging
+
+from benchmarks import pipeline, synthetic
+
+def files(root):
+	return { path.relative_to(root): (path.read_bytes(), path.stat().st_ino) for path in root.rglob("*") if path.is_file() }
+
+def test_render_leaves_hardlinked_package_alone(tmp_path):
+	root = tmp_path/"p"
+	modules = synthetic.generate(root, synthetic.SyntheticConfig(templates=8))
+	project = pipeline.load_project(root, modules)
+
+	try:
+		project.render(StaticWebDoc.BuildFlags())
+		report = project.package(link=packaging.HARDLINK)
+		packaged = files(tmp_path/"build")
+		rendered = files(root/"render")
+
+		# Changes the fields and the page of a template, and appends the data of a new one to embedded_data.json.
+		time.sleep(0.01)
+		page = root/"template"/synthetic.page_name(synthetic.SyntheticConfig(templates=8), 3)
+		page.write_text(page.read_text().replace("Summary", "Changed summary"))
+		(root/"template"/"zz.jinja").write_text('{% datasection page %}{% data item = "new" %}{% enddatasection %}<p>New</p>\n')
+
+		project.render(StaticWebDoc.BuildFlags())
+	finally:
+		StaticWebDoc.Project.current = None
+
+	assert report.linked > 0 and len(packaged) > 0
+	assert files(root/"render") != rendered
+	assert files(tmp_path/"build") == packaged
+
+def test_compress_keeps_siblings_up_to_date(tmp_path):
+	compression = packaging.Compression(min_size=100)
+	(tmp_path/"large.js").write_text("console.log(1);\n" * 20)
+	(tmp_path/"small.js").write_text("console.log(1);\n")
+
+	report = packaging.compress(tmp_path, compression)
+
+	assert report.compressed == 1
+	assert gzip.decompress((tmp_path/"large.js.gz").read_bytes()) == (tmp_path/"large.js").read_bytes()
+	assert not (tmp_path/"small.js.gz").exists()
+	assert packaging.compress(tmp_path, compression).unchanged == 1
+
+	# Below min_size the sibling would only be served stale.
+	(tmp_path/"large.js").write_text("console.log(2);\n")
+	report = packaging.compress(tmp_path, compression)
+
+	assert report.removed == 1
+	assert not (tmp_path/"large.js.gz").exists()
@@ -0,0 +1,62 @@
+import collections
+import logging
+import pathlib
+import shutil
+
+import StaticWebDoc
+
+from benchmarks import pipeline, synthetic
+
+from test_incremental import project_type_project, rendered
+
+class RenderLog(logging.Logger):
+	""" Appends the rendered templates to a file, which the forked render workers share. """
+
+	def __init__(self, path):
+		super().__init__("render")
+		self.path = path
+
+	def normal(self, msg, color=None):
+		if msg.startswith("[Render] "):
+			with open(self.path, "a") as f:
+				f.write(msg[len("[Render] "):] + "\n")
+
+def test_cold_parallel_build_renders_every_template_once(tmp_path):
+	""" A first build knows no fields, so every get_field across workers is deferred. """
+	root = tmp_path/"p"
+	modules = synthetic.generate(root, synthetic.SyntheticConfig(templates=16, cross_refs=2))
+	project = pipeline.load_project(root, modules)
+	project.logger = RenderLog(tmp_path/"render.log")
+
+	try:
+		project.render(StaticWebDoc.BuildFlags(), jobs=2)
+	finally:
+		StaticWebDoc.Project.current = None
+
+	rendered = collections.Counter((tmp_path/"render.log").read_text().splitlines())
+
+	assert len(rendered) == 17
+	assert set(rendered.values()) == {1}
+
+def test_parallel_build_keeps_project_types(tmp_path, monkeypatch):
+	""" Render workers send embedded data back pickled, so other templates read the objects, not their JSON values. """
+	monkeypatch.setattr(StaticWebDoc, "GLOBAL_PROJECT_TYPES", [])
+	root = tmp_path/"typed_parallel"
+	project_type_project(root)
+	project = pipeline.load_project(root, root)
+	project.logger = RenderLog(tmp_path/"render.log")
+
+	try:
+		project.render(StaticWebDoc.BuildFlags(), jobs=2)
+		parallel = rendered(root/"render")
+
+		for directory in ["render", ".swd"]:
+			shutil.rmtree(root/directory)
+		project.render(StaticWebDoc.BuildFlags())
+	finally:
+		StaticWebDoc.Project.current = None
+
+	assert b"Hello Ann" in parallel[pathlib.Path("document/index.html")]
+	assert parallel == rendered(root/"render")
+	# The author page is not rendered again to get its objects back.
+	assert collections.Counter((tmp_path/"render.log").read_text().splitlines())["author.jinja"] == 2
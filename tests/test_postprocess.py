@@ -0,0 +1,13 @@
+import StaticWebDoc.postprocess as postprocess
+
+def test_same_content_compares_every_chunk(tmp_path):
+	a = tmp_path/"a.html"
+	b = tmp_path/"b.html"
+	a.write_bytes(b"x" * 10 + b"y")
+	b.write_bytes(b"x" * 10 + b"z")
+
+	assert not postprocess.same_content(a, b, chunk_size=4)
+
+	b.write_bytes(b"x" * 10 + b"y")
+	assert postprocess.same_content(a, b, chunk_size=4)
+	assert not postprocess.same_content(a, tmp_path/"missing.html")
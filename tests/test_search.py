@@ -0,0 +1,56 @@
+import orjson
+
+import StaticWebDoc
+import StaticWebDoc.search as search
+
+from benchmarks import pipeline, synthetic
+
+def read(path):
+	return orjson.loads(path.read_bytes())
+
+def test_shard_keys():
+	assert search.shard_key("summary") == "su"
+	assert search.shard_key("été") == "_" + "ét".encode("utf-8").hex()
+	assert search.terms("A page, with some_words") == ["page", "with", "some_words"]
+
+def test_index_shards_and_document_ids(tmp_path, monkeypatch):
+	monkeypatch.setattr(StaticWebDoc.Project, "search_index", True)
+	root = tmp_path/"searched"
+	config = synthetic.SyntheticConfig(templates=8)
+	modules = synthetic.generate(root, config)
+	project = pipeline.load_project(root, modules)
+	index_path = root/"render"/StaticWebDoc.DATA_DIR/"search"
+
+	try:
+		project.render(StaticWebDoc.BuildFlags())
+		documents = read(index_path/search.DOCUMENTS_FILE)
+
+		# Removes a page nothing references (pages only reference pages with a lower index), and adds one.
+		(root/"template"/synthetic.page_name(config, config.templates - 1)).unlink()
+		(root/"template"/"zebra.jinja").write_text("<html><body><p>Zebra</p></body></html>\n")
+		project.render(StaticWebDoc.BuildFlags())
+	finally:
+		StaticWebDoc.Project.current = None
+
+	index = read(index_path/search.INDEX_FILE)
+
+	assert index["shards"] == sorted(path.stem for path in (index_path/search.SHARD_DIR).iterdir())
+
+	for key in index["shards"]:
+		for term, postings in read(index_path/search.SHARD_DIR/f"{key}.json").items():
+			assert search.shard_key(term) == key
+			assert [document for document, _ in postings] == sorted(document for document, _ in postings)
+
+	summary = read(index_path/search.SHARD_DIR/"su.json")["summary"]
+	# Every page has the summary field, which weighs more than its text.
+	assert len(summary) == config.templates and all(weight >= search.FIELD_WEIGHT for _, weight in summary)
+
+	# The ids of the remaining pages stay the same, the removed page leaves a gap and the new page gets a new id.
+	updated = read(index_path/search.DOCUMENTS_FILE)
+	removed = [document for document, entry in enumerate(documents) if "page7" in entry["url"]]
+	zebra = [document for document, entry in enumerate(updated) if entry is not None and "zebra" in entry["url"]]
+
+	assert len(removed) == 1 and updated[removed[0]] is None
+	assert all(updated[document] == entry for document, entry in enumerate(documents) if document not in removed)
+	assert zebra == [len(documents)]
+	assert read(index_path/search.SHARD_DIR/"ze.json")["zebra"] == [[len(documents), 1]]
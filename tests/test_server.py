@@ -0,0 +1,83 @@
+import contextlib
+import http.client
+import threading
+
+import StaticWebDoc
+import StaticWebDoc.server as server
+
+from benchmarks import pipeline, synthetic
+
+@contextlib.contextmanager
+def serving(directory, notifier=None, project=None):
+	class TestServer(server.SWD_Server):
+		pass
+
+	TestServer.directory = str(directory)
+	TestServer.notifier = notifier
+	TestServer.project = project
+	httpd = TestServer(("127.0.0.1", 0), server.SWD_Router)
+	thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+	thread.start()
+
+	try:
+		yield httpd.server_address[1]
+	finally:
+		httpd.shutdown()
+		httpd.server_close()
+
+def request(port, path, method="GET", **headers):
+	connection = http.client.HTTPConnection("127.0.0.1", port)
+
+	try:
+		connection.request(method, path, headers=headers)
+		response = connection.getresponse()
+		return response.status, dict(response.getheaders()), response.read()
+	finally:
+		connection.close()
+
+def test_files_are_served_with_etags(tmp_path):
+	(tmp_path/"page.html").write_bytes(b"<html><body>page</body></html>")
+	(tmp_path/"page.html.gz").write_bytes(b"compressed")
+
+	with serving(tmp_path) as port:
+		status, headers, body = request(port, "/page.html")
+		assert status == 200 and body == b"<html><body>page</body></html>"
+
+		status, _, _ = request(port, "/page.html", **{ "If-None-Match": headers["ETag"] })
+		assert status == 304
+
+		status, headers, body = request(port, "/page.html", **{ "Accept-Encoding": "gzip" })
+		assert headers["Content-Encoding"] == "gzip" and body == b"compressed"
+
+def test_watched_pages_are_served_with_etags(tmp_path):
+	(tmp_path/"page.html").write_bytes(b"<html><body>page</body></html>")
+
+	with serving(tmp_path, server.ReloadNotifier()) as port:
+		status, headers, body = request(port, "/page.html")
+		assert status == 200 and server.RELOAD_PATH.encode("utf-8") in body
+		assert headers["Content-Length"] == str(len(body))
+
+		status, _, _ = request(port, "/page.html", **{ "If-None-Match": headers["ETag"] })
+		assert status == 304
+
+		(tmp_path/"page.html").write_bytes(b"<html><body>changed</body></html>")
+
+		status, _, _ = request(port, "/page.html", **{ "If-None-Match": headers["ETag"] })
+		assert status == 200
+
+def test_head_reports_the_page_rendered_on_demand(tmp_path):
+	root = tmp_path/"head"
+	modules = synthetic.generate(root, synthetic.SyntheticConfig(templates=1))
+	project = pipeline.load_project(root, modules)
+
+	try:
+		with serving(root, project=project) as port:
+			status, headers, body = request(port, "/document/index.html")
+			assert status == 200 and len(body) > 0
+
+			status, head_headers, head_body = request(port, "/document/index.html", method="HEAD")
+			assert status == 200 and head_body == b""
+			assert head_headers["Content-Length"] == headers["Content-Length"]
+			assert head_headers["ETag"] == headers["ETag"]
+	finally:
+		StaticWebDoc.Project.current = None